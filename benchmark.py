@@ -0,0 +1,231 @@
+from synth import MAINFIELD_LAYOUT, SynthConfig, WorldLayout, write_world
+from vstats import *
+from typing import Any, Callable
+import argparse
+import json
+import time
+import tracemalloc
+try:
+    import resource
+except ImportError:
+    resource = None # not available on Windows
+
+# benchmarks the decode and export paths on synthetic worlds (see synth.py) so performance changes can be compared
+# against a baseline without the game files
+# every stage reports its throughput and, unless disabled, its peak traced allocation size from a second run under
+# tracemalloc (numpy allocations are traced too) so the timings aren't skewed by tracing
+
+@dataclass
+class BenchmarkScale:
+    world_name: str
+    layout: WorldLayout
+    units: List[Tuple[int, int]]
+    config: SynthConfig
+
+SCALES: Dict[str, BenchmarkScale] = {
+    "small": BenchmarkScale("Small", WorldLayout((500, 500, 500), (-500, -4000, -500), (2, 1, 2)),
+                            [(x, z) for x in range(2) for z in range(2)], SynthConfig()),
+    "medium": BenchmarkScale("Medium", WorldLayout((500, 1000, 500), (-1000, -4000, -1000), (4, 1, 4)),
+                             [(x, z) for x in range(4) for z in range(4)], SynthConfig(amplitude=150, thickness=3)),
+    # MainField sized units (2x32x2 areas) with terrain around y = 0, only a 2x2 block of the grid is written
+    "mainfield": BenchmarkScale("MainField", MAINFIELD_LAYOUT, [(9, 7), (10, 7), (9, 8), (10, 8)],
+                                SynthConfig(base_height=4000, amplitude=200, thickness=4)),
+}
+
+@dataclass
+class StageResult:
+    name: str
+    seconds: float
+    items: int # voxels, points or units depending on the stage
+    item_name: str
+    nbytes: int = 0 # bytes processed, reported as MB/s if set
+    peak_bytes: Union[int, None] = None # only measured when tracing memory
+
+    def to_dict(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            "seconds": self.seconds,
+            self.item_name: self.items,
+            f"{self.item_name}_per_second": self.items / self.seconds if self.seconds else 0.0,
+        }
+        if self.nbytes:
+            result["mb_per_second"] = self.nbytes / self.seconds / 0x100000 if self.seconds else 0.0
+        if self.peak_bytes is not None:
+            result["peak_mb"] = self.peak_bytes / 0x100000
+        return result
+
+    def __str__(self) -> str:
+        rate: float = self.items / self.seconds if self.seconds else 0.0
+        line: str = f"  {self.name:<18} {self.seconds:8.3f} s {rate:14,.0f} {self.item_name}/s"
+        if self.nbytes:
+            line += f" {self.nbytes / self.seconds / 0x100000 if self.seconds else 0.0:9.1f} MB/s"
+        if self.peak_bytes is not None:
+            line += f" {self.peak_bytes / 0x100000:9.1f} MB peak"
+        return line
+
+class Benchmark:
+    def __init__(self, romfs_path: str, scale: BenchmarkScale, trace_memory: bool = True, seed: int = 0) -> None:
+        self.scale = scale
+        self.trace_memory = trace_memory
+        self.ctx: Context = Context(romfs_path, scale.world_name, [])
+        self.units: List[Tuple[str, List[int]]] = [
+            (self.ctx.get_unit_path(x, z), self.ctx.get_unit_base(x, z)) for x, z in scale.units
+        ]
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+        self.results: List[StageResult] = []
+
+    # func returns (items, bytes)
+    def run(self, name: str, item_name: str, func: Callable[[], Tuple[int, int]]) -> StageResult:
+        start: float = time.perf_counter()
+        items, nbytes = func()
+        result: StageResult = StageResult(name, time.perf_counter() - start, items, item_name, nbytes)
+        if self.trace_memory:
+            tracemalloc.start()
+            func()
+            result.peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.results.append(result)
+        print(result)
+        return result
+
+    def parse(self) -> Tuple[int, int]:
+        nbytes: int = 0
+        for path, base in self.units:
+            nbytes += self.ctx.open_unit(path).nbytes
+        return len(self.units), nbytes
+
+    # the original list based loader on the first unit only since it's much slower
+    def parse_lists(self) -> Tuple[int, int]:
+        path: str = self.units[0][0]
+        areas: List[Area] = self.ctx.load_unit(path)
+        return len(areas), self.ctx.open_unit(path).nbytes
+
+    def traverse(self) -> Tuple[int, int]:
+        voxels: int = 0
+        for path, base in self.units:
+            unit: Unit = self.ctx.open_unit(path)
+            voxels += len(self.ctx.decode_unit(unit, base))
+        return voxels, 0
+
+    def stats(self) -> Tuple[int, int]:
+        voxels: int = 0
+        for path, base in self.units:
+            voxels += self.ctx.compute_unit_stats(path, base).voxels
+        return voxels, 0
+
+    # checks that every full resolution voxel is inside some cube emitted at max_level, the cubes of neighboring areas
+    # are on differently offset grids so the voxels are looked up in the grid of every offset the cubes use
+    def check_lod_coverage(self, max_level: int) -> None:
+        size: int = get_voxel_size(max_level)
+        for path, base in self.units:
+            unit: Unit = self.ctx.open_unit(path)
+            voxels: np.ndarray = self.ctx.decode_unit(unit, base).astype(np.int64)
+            cubes: np.ndarray = self.ctx.decode_unit(unit, base, max_level=max_level).astype(np.int64)
+            low: np.ndarray = np.minimum(voxels.min(axis=0, initial=0), cubes.min(axis=0, initial=0))
+            def pack(positions: np.ndarray) -> np.ndarray:
+                positions = positions - low
+                return positions[:, 0] << 42 | positions[:, 1] << 21 | positions[:, 2]
+            covered: np.ndarray = np.zeros(len(voxels), dtype=bool)
+            offsets: np.ndarray = cubes % size
+            for offset in np.unique(offsets, axis=0):
+                keys: np.ndarray = pack(cubes[np.all(offsets == offset, axis=1)])
+                covered |= np.isin(pack((voxels - offset) // size * size + offset), keys)
+            assert covered.all(), f"{np.count_nonzero(~covered)} voxels of {path} aren't covered at level {max_level}"
+
+    # the original recursive traversal on the first few non-empty areas of the first unit
+    def traverse_recursive(self) -> Tuple[int, int]:
+        path, base = self.units[0]
+        voxels: int = 0
+        areas: List[Area] = [area for area in self.ctx.load_unit(path) if len(area.voxel_masks[0]) != 0][:2]
+        for area in areas:
+            positions: List[List[int]] = []
+            self.ctx.iterate_octree(self.ctx.get_area_base(area, base), positions, area, 0)
+            voxels += len(positions)
+        return voxels, 0
+
+    # points near the terrain so the descents don't all stop at the root
+    def get_query_points(self, count: int) -> np.ndarray:
+        bases: np.ndarray = np.array([base for path, base in self.units], dtype=np.int64)
+        unit_size: np.ndarray = np.array(self.ctx.unit_size, dtype=np.int64)
+        points: np.ndarray = bases[self.rng.integers(0, len(bases), count)]
+        points[:, [0, 2]] += self.rng.integers(0, unit_size[[0, 2]], (count, 2))
+        height: int = self.ctx.world_base[1] + self.scale.config.base_height
+        points[:, 1] = height + self.rng.integers(-self.scale.config.amplitude - 8, self.scale.config.amplitude + 8, count)
+        return points
+
+    def query_many(self, points: np.ndarray) -> Tuple[int, int]:
+        self.ctx.query_many(points)
+        return len(points), 0
+
+    def query(self, points: np.ndarray) -> Tuple[int, int]:
+        for x, y, z in points.tolist():
+            self.ctx.query(x, y, z)
+        return len(points), 0
+
+    def export(self, outpath: str, format: str) -> Tuple[int, int]:
+        voxels: int = 0
+        with get_exporter(outpath, format, self.ctx.get_coordinate_dtype()) as exporter:
+            for path, base in self.units:
+                voxels += self.ctx.export_unit(path, base, exporter)
+        return voxels, os.path.getsize(outpath)
+
+    def export_obj(self, outpath: str) -> Tuple[int, int]:
+        voxels: int = 0
+        with open(outpath, "w", encoding="utf-8") as outfile:
+            for path, base in self.units:
+                voxels += self.ctx.dump_unit_obj(path, base, outfile)
+        return voxels, os.path.getsize(outpath)
+
+    def run_all(self, workdir: str, query_count: int = 100000) -> List[StageResult]:
+        self.run("parse", "units", self.parse)
+        self.run("parse_lists", "areas", self.parse_lists)
+        self.run("traverse", "voxels", self.traverse)
+        # not timed, a failed check means the level of detail exports lose voxels
+        for max_level in (2, 4, 6):
+            self.check_lod_coverage(max_level)
+        self.run("traverse_recursive", "voxels", self.traverse_recursive)
+        self.run("stats", "voxels", self.stats)
+        # queries go through the unit cache so warm it up first
+        points: np.ndarray = self.get_query_points(query_count)
+        self.ctx.query_many(points[:len(self.units) * 100])
+        self.run("query_many", "points", lambda: self.query_many(points))
+        self.run("query", "points", lambda: self.query(points[:query_count // 10]))
+        self.run("export_npy", "voxels", lambda: self.export(os.path.join(workdir, "bench.npy"), "npy"))
+        self.run("export_runs", "voxels", lambda: self.export(os.path.join(workdir, "bench.runs.npy"), "runs"))
+        self.run("export_obj", "voxels", lambda: self.export_obj(os.path.join(workdir, "bench.obj")))
+        return self.results
+
+def run_scale(name: str, workdir: str, trace_memory: bool = True, generate: bool = True) -> Dict[str, Any]:
+    scale: BenchmarkScale = SCALES[name]
+    romfs_path: str = os.path.join(workdir, name)
+    generate_seconds: float = 0.0
+    if generate or not os.path.isdir(os.path.join(romfs_path, "VolumeStats", scale.world_name)):
+        start: float = time.perf_counter()
+        write_world(romfs_path, scale.world_name, scale.config, scale.layout, scale.units)
+        generate_seconds = time.perf_counter() - start
+    print(f"{name} ({scale.world_name}, {len(scale.units)} units, generated in {generate_seconds:.1f} s)")
+    benchmark: Benchmark = Benchmark(romfs_path, scale, trace_memory)
+    results: List[StageResult] = benchmark.run_all(workdir)
+    return {result.name: result.to_dict() for result in results}
+
+if __name__ == "__main__":
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Benchmark vstats on synthetic worlds")
+    parser.add_argument("scales", nargs="*", default=["small", "medium"], choices=list(SCALES))
+    parser.add_argument("--workdir", default="", help="where the worlds and exports are written (default: a temporary directory)")
+    parser.add_argument("--reuse", action="store_true", help="reuse previously generated worlds in --workdir")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc runs")
+    parser.add_argument("--json", default="", help="write the results to this file")
+    args: argparse.Namespace = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        workdir: str = args.workdir or tmpdir
+        os.makedirs(workdir, exist_ok=True)
+        report: Dict[str, Any] = {
+            scale: run_scale(scale, workdir, not args.no_memory, not args.reuse) for scale in args.scales
+        }
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux (bytes on macOS)
+        report["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 0x400
+        print(f"max rss {report['max_rss_mb']:.1f} MB")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as outfile:
+            json.dump(report, outfile, indent=2)
@@ -0,0 +1,161 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Tuple, Union
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+class UnitCache:
+    # LRU cache of decoded units, bounded by decoded size (unit.nbytes) rather than entry count
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def get(self, key: Hashable) -> Any:
+        with self.lock:
+            unit = self.entries.get(key)
+            if unit is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return unit
+
+    def put(self, key: Hashable, unit: Any) -> None:
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key).nbytes
+            self.entries[key] = unit
+            self.size += unit.nbytes
+            # units larger than the whole cache are dropped right away
+            while self.size > self.max_bytes and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.nbytes
+                self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        unit = self.get(key)
+        if unit is None:
+            unit = loader()
+            self.put(key, unit)
+        return unit
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+DISK_CACHE_MAGIC: bytes = b"VSTC"
+DISK_CACHE_VERSION: int = 1
+
+class DiskCache:
+    # persistent cache of decompressed units, memory-mapped on later runs
+    # entries are named after the content hash of the source file, every source path has a small index record
+    # (<hash of the path>.key holding its size, mtime and content hash) so unchanged files don't have to be rehashed
+    # records are separate files so processes sharing the cache never overwrite each other's
+    # file layout: magic, u32 version, u32 area count, u32 payload offset, u64 area offsets[area count], payload
+    # where the payload is the decompressed unit as is (so the area arrays can be viewed straight from the map)
+    def __init__(self, cache_dir: str) -> None:
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        # index records already read or written by this process
+        self.index: Dict[str, List[Any]] = {}
+        self.lock = threading.Lock()
+
+    def get_record_path(self, source_path: str) -> str:
+        name: str = hashlib.blake2b(source_path.encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.key")
+
+    def load_record(self, source_path: str) -> Union[List[Any], None]:
+        with self.lock:
+            entry: Union[List[Any], None] = self.index.get(source_path)
+        if entry is not None:
+            return entry
+        try:
+            with open(self.get_record_path(source_path), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None # a missing or corrupt record only means the file gets rehashed
+        if not isinstance(entry, list) or len(entry) != 3:
+            return None
+        with self.lock:
+            self.index[source_path] = entry
+        return entry
+
+    def get_key(self, source_path: str) -> str:
+        source_path = os.path.abspath(source_path)
+        stat: os.stat_result = os.stat(source_path)
+        entry: Union[List[Any], None] = self.load_record(source_path)
+        if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        key: str = hashlib.blake2b(Path(source_path).read_bytes(), digest_size=16).hexdigest()
+        entry = [stat.st_size, stat.st_mtime_ns, key]
+        with self.lock:
+            self.index[source_path] = entry
+        self.write_atomic(self.get_record_path(source_path), json.dumps(entry).encode("utf-8"))
+        return key
+
+    def get_entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.vstc")
+
+    # returns a view of the cached payload and the area offsets into it or None if not cached
+    def load(self, key: str) -> Union[Tuple[memoryview, List[int]], None]:
+        path: str = self.get_entry_path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < 0x10:
+                return None
+            data: mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, area_count, payload_offset = struct.unpack_from("<4sIII", data, 0)
+        if magic != DISK_CACHE_MAGIC or version != DISK_CACHE_VERSION:
+            return None
+        offsets: List[int] = list(struct.unpack_from(f"<{area_count}Q", data, 0x10))
+        return memoryview(data)[payload_offset:], offsets
+
+    def store(self, key: str, data: bytes, offsets: List[int]) -> None:
+        # keep the payload aligned for the u32/u64 views
+        payload_offset: int = 0x10 + len(offsets) * 8
+        payload_offset += -payload_offset % 0x10
+        header: bytes = struct.pack("<4sIII", DISK_CACHE_MAGIC, DISK_CACHE_VERSION, len(offsets), payload_offset)
+        header += struct.pack(f"<{len(offsets)}Q", *offsets)
+        header += b"\x00" * (payload_offset - len(header))
+        self.write_atomic(self.get_entry_path(key), header + bytes(data))
+
+    # write to a temporary file first so other processes never see a partial entry
+    @staticmethod
+    def write_atomic(path: str, data: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
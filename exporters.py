@@ -0,0 +1,238 @@
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("numpy not found (pip install numpy)")
+from typing import Dict, Type
+import abc
+import io
+import shutil
+import struct
+import tempfile
+
+# all exporters stream positions as they are decoded (write can be called once per area) and patch the element
+# count into a fixed size header on close so the output can be memory-mapped by downstream tools
+# positions are the minimum corners of voxel_size sized cubes (larger than 1 for level of detail exports)
+
+class Exporter:
+    extension: str = ""
+
+    def __init__(self, outpath: str, dtype: np.dtype = np.int32, voxel_size: int = 1) -> None:
+        self.dtype: np.dtype = np.dtype(dtype).newbyteorder("<")
+        self.voxel_size: int = voxel_size
+        self.count: int = 0
+        self.outfile: io.BufferedWriter = open(outpath, "wb")
+        self.write_header()
+
+    def __enter__(self) -> "Exporter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write_header(self) -> None:
+        pass
+
+    def finish_header(self) -> None:
+        pass
+
+    # positions is an (N, 3) array of voxel positions
+    def write(self, positions: np.ndarray) -> None:
+        data: np.ndarray = self.prepare(positions)
+        if len(data) == 0:
+            return
+        self.outfile.write(np.ascontiguousarray(data, dtype=self.dtype).tobytes())
+        self.count += len(data)
+
+    def prepare(self, positions: np.ndarray) -> np.ndarray:
+        return positions
+
+    def close(self) -> None:
+        if self.outfile.closed:
+            return
+        self.finish_header()
+        self.outfile.close()
+
+class PlyExporter(Exporter):
+    extension: str = "ply"
+    header_size: int = 0x100
+
+    def get_header(self) -> bytes:
+        prop_type: str = {1: "char", 2: "short", 4: "int"}[self.dtype.itemsize]
+        header: str = "ply\nformat binary_little_endian 1.0\n" \
+            f"comment voxel_size {self.voxel_size}\n" \
+            f"element vertex {self.count}\n" \
+            f"property {prop_type} x\nproperty {prop_type} y\nproperty {prop_type} z\n"
+        # pad with a comment so the header can be rewritten in place once the vertex count is known
+        padding: int = self.header_size - len(header) - len("comment \nend_header\n")
+        return (header + "comment " + " " * padding + "\nend_header\n").encode("ascii")
+
+    def write_header(self) -> None:
+        self.outfile.write(self.get_header())
+
+    def finish_header(self) -> None:
+        self.outfile.seek(0)
+        self.outfile.write(self.get_header())
+
+class NpyExporter(Exporter):
+    extension: str = "npy"
+    columns: int = 3
+    header_size: int = 0x80
+
+    def get_header(self) -> bytes:
+        header: str = f"{{'descr': '{self.dtype.str}', 'fortran_order': False, 'shape': ({self.count}, {self.columns}), }}"
+        # npy v1.0 header, padded with spaces to a fixed size (multiple of 64) and terminated by a newline
+        header = header.ljust(self.header_size - 10 - 1) + "\n"
+        return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
+
+    def write_header(self) -> None:
+        self.outfile.write(self.get_header())
+
+    def finish_header(self) -> None:
+        self.outfile.seek(0)
+        self.outfile.write(self.get_header())
+
+RUN_KEY_BITS: int = 21
+RUN_KEY_MASK: int = (1 << RUN_KEY_BITS) - 1
+RUN_KEY_OFFSET: int = 1 << (RUN_KEY_BITS - 1)
+
+# run-length voxel format, an npy array of (x, y, z, length) rows where each row covers the voxels
+# (x, y, z) to (x + (length - 1) * voxel_size, y, z)
+# runs are built per write call so a run crossing an area boundary is split into two rows
+class RunLengthExporter(NpyExporter):
+    extension: str = "runs.npy"
+    columns: int = 4
+
+    def prepare(self, positions: np.ndarray) -> np.ndarray:
+        if len(positions) == 0:
+            return positions
+        # pack into one sortable key (z, y, x) with 21 bits per component like mesh.py, offset so negative positions
+        # sort correctly
+        positions = np.asarray(positions, dtype=np.int64) + RUN_KEY_OFFSET
+        assert positions.min() >= 0 and positions.max() <= RUN_KEY_MASK, "Positions out of range for run-length keys"
+        keys: np.ndarray = np.unique(
+            positions[:, 2] << (RUN_KEY_BITS * 2) | positions[:, 1] << RUN_KEY_BITS | positions[:, 0]
+        )
+        rows: np.ndarray = keys >> RUN_KEY_BITS
+        x: np.ndarray = keys & RUN_KEY_MASK
+        starts: np.ndarray = np.ones(len(keys), dtype=bool)
+        starts[1:] = (rows[1:] != rows[:-1]) | (x[1:] != x[:-1] + self.voxel_size)
+        start_idx: np.ndarray = np.flatnonzero(starts)
+        lengths: np.ndarray = np.diff(np.append(start_idx, len(keys)))
+        start_keys: np.ndarray = keys[start_idx]
+        return np.column_stack((
+            (start_keys & RUN_KEY_MASK) - RUN_KEY_OFFSET,
+            (start_keys >> RUN_KEY_BITS & RUN_KEY_MASK) - RUN_KEY_OFFSET,
+            (start_keys >> (RUN_KEY_BITS * 2)) - RUN_KEY_OFFSET,
+            lengths
+        ))
+
+# indexed quad meshes (see mesh.py), vertices are written as they come in while faces are spooled to a temporary
+# file and appended on close since both formats expect every vertex before the first face
+class MeshExporter(abc.ABC):
+    extension: str = ""
+
+    def __init__(self, outpath: str, dtype: np.dtype = np.int32) -> None:
+        self.dtype: np.dtype = np.dtype(dtype).newbyteorder("<")
+        self.vertex_count: int = 0
+        self.face_count: int = 0
+        self.outfile: io.BufferedWriter = open(outpath, "wb")
+        self.facefile: io.BufferedRandom = tempfile.TemporaryFile()
+        self.write_header()
+
+    def __enter__(self) -> "MeshExporter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write_header(self) -> None:
+        pass
+
+    def finish_header(self) -> None:
+        pass
+
+    def write_mesh(self, vertices: np.ndarray, faces: np.ndarray) -> None:
+        if len(vertices) == 0:
+            return
+        self.outfile.write(self.format_vertices(vertices))
+        self.facefile.write(self.format_faces(faces.astype(np.int64) + self.vertex_count))
+        self.vertex_count += len(vertices)
+        self.face_count += len(faces)
+
+    @abc.abstractmethod
+    def format_vertices(self, vertices: np.ndarray) -> bytes:
+        pass
+
+    @abc.abstractmethod
+    def format_faces(self, faces: np.ndarray) -> bytes:
+        pass
+
+    def close(self) -> None:
+        if self.outfile.closed:
+            return
+        self.facefile.seek(0)
+        shutil.copyfileobj(self.facefile, self.outfile)
+        self.facefile.close()
+        self.finish_header()
+        self.outfile.close()
+
+class PlyMeshExporter(MeshExporter):
+    extension: str = "ply"
+    header_size: int = 0x100
+
+    def get_header(self) -> bytes:
+        prop_type: str = {1: "char", 2: "short", 4: "int"}[self.dtype.itemsize]
+        header: str = "ply\nformat binary_little_endian 1.0\n" \
+            f"element vertex {self.vertex_count}\n" \
+            f"property {prop_type} x\nproperty {prop_type} y\nproperty {prop_type} z\n" \
+            f"element face {self.face_count}\nproperty list uchar uint vertex_indices\n"
+        padding: int = self.header_size - len(header) - len("comment \nend_header\n")
+        return (header + "comment " + " " * padding + "\nend_header\n").encode("ascii")
+
+    def write_header(self) -> None:
+        self.outfile.write(self.get_header())
+
+    def finish_header(self) -> None:
+        self.outfile.seek(0)
+        self.outfile.write(self.get_header())
+
+    def format_vertices(self, vertices: np.ndarray) -> bytes:
+        return np.ascontiguousarray(vertices, dtype=self.dtype).tobytes()
+
+    def format_faces(self, faces: np.ndarray) -> bytes:
+        records: np.ndarray = np.empty(len(faces), dtype=[("count", "u1"), ("indices", "<u4", (faces.shape[1],))])
+        records["count"] = faces.shape[1]
+        records["indices"] = faces
+        return records.tobytes()
+
+class ObjMeshExporter(MeshExporter):
+    extension: str = "obj"
+
+    def format_vertices(self, vertices: np.ndarray) -> bytes:
+        return (("v %d %d %d\n" * len(vertices)) % tuple(vertices.ravel().tolist())).encode("ascii")
+
+    def format_faces(self, faces: np.ndarray) -> bytes:
+        # obj indices are 1-based
+        line: str = "f" + " %d" * faces.shape[1] + "\n"
+        return ((line * len(faces)) % tuple((faces + 1).ravel().tolist())).encode("ascii")
+
+MESH_EXPORTERS: Dict[str, Type[MeshExporter]] = {
+    "ply": PlyMeshExporter,
+    "obj": ObjMeshExporter,
+}
+
+def get_mesh_exporter(outpath: str, format: str, dtype: np.dtype = np.int32) -> MeshExporter:
+    if format not in MESH_EXPORTERS:
+        raise ValueError(f"Unknown mesh format {format}, expected one of {list(MESH_EXPORTERS)}")
+    return MESH_EXPORTERS[format](outpath, dtype)
+
+EXPORTERS: Dict[str, Type[Exporter]] = {
+    "ply": PlyExporter,
+    "npy": NpyExporter,
+    "runs": RunLengthExporter,
+}
+
+def get_exporter(outpath: str, format: str, dtype: np.dtype = np.int32, voxel_size: int = 1) -> Exporter:
+    if format not in EXPORTERS:
+        raise ValueError(f"Unknown export format {format}, expected one of {list(EXPORTERS)}")
+    return EXPORTERS[format](outpath, dtype, voxel_size)
@@ -0,0 +1,90 @@
+from typing import Any, Callable, Dict, List, Union
+import json
+import threading
+import time
+
+# optional timing and counter collection for Context and ZstdDecompContext pipelines
+# instrumented code only checks whether an Instrumentation is attached (the attribute is None otherwise) so nothing is
+# timed or counted when it's disabled
+# every measurement is an event (unit, stage, seconds, counts) that is added to per-stage and per-unit totals and passed
+# to the registered hooks, counts are things like bytes_in, bytes_out, areas, nodes and voxels
+# stages: read (file reads), decompress, parse (indexing a decompressed unit), traverse (octree decoding), write
+# (exporters), format (obj text), mesh, rasterize, stats, wait (blocked on prefetched units) and query
+
+Event = Dict[str, Any]
+Hook = Callable[[Event], None]
+
+class Instrumentation:
+    def __init__(self) -> None:
+        self.hooks: List[Hook] = []
+        # stage -> totals, totals always have calls and seconds plus every count that was reported for the stage
+        self.stages: Dict[str, Dict[str, Union[int, float]]] = {}
+        # unit path -> stage -> totals
+        self.units: Dict[str, Dict[str, Dict[str, Union[int, float]]]] = {}
+        # free-form counters (cache hits and such)
+        self.counters: Dict[str, int] = {}
+        self.start_time: float = time.perf_counter()
+        self.lock = threading.Lock()
+
+    # hooks are called with every event from the thread that recorded it
+    def add_hook(self, hook: Hook) -> None:
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook: Hook) -> None:
+        self.hooks.remove(hook)
+
+    def add(self, unit: str, stage: str, seconds: float, **counts: int) -> None:
+        with self.lock:
+            self.accumulate(self.stages.setdefault(stage, {}), seconds, counts)
+            if unit:
+                self.accumulate(self.units.setdefault(unit, {}).setdefault(stage, {}), seconds, counts)
+        if self.hooks:
+            event: Event = {"unit": unit, "stage": stage, "seconds": seconds, **counts}
+            for hook in self.hooks:
+                hook(event)
+
+    @staticmethod
+    def accumulate(totals: Dict[str, Union[int, float]], seconds: float, counts: Dict[str, int]) -> None:
+        totals["calls"] = totals.get("calls", 0) + 1
+        totals["seconds"] = totals.get("seconds", 0.0) + seconds
+        for name, value in counts.items():
+            totals[name] = totals.get(name, 0) + value
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def get_unit_seconds(self, unit: str) -> float:
+        return sum(totals["seconds"] for totals in self.units.get(unit, {}).values())
+
+    # units sorted by the total time recorded for them, slowest first
+    def get_slowest_units(self, count: int = 10) -> List[Dict[str, Any]]:
+        with self.lock:
+            units: List[str] = sorted(self.units, key=self.get_unit_seconds, reverse=True)[:count]
+            return [{"unit": unit, "seconds": self.get_unit_seconds(unit)} for unit in units]
+
+    def reset(self) -> None:
+        with self.lock:
+            self.stages.clear()
+            self.units.clear()
+            self.counters.clear()
+            self.start_time = time.perf_counter()
+
+    # extra holds anything else worth reporting (Context adds its unit cache statistics)
+    def get_report(self, extra: Union[Dict[str, Any], None] = None) -> Dict[str, Any]:
+        slowest: List[Dict[str, Any]] = self.get_slowest_units()
+        with self.lock:
+            report: Dict[str, Any] = {
+                "wall_seconds": time.perf_counter() - self.start_time,
+                "stages": {stage: dict(totals) for stage, totals in self.stages.items()},
+                "counters": dict(self.counters),
+                "slowest_units": slowest,
+                "units": {unit: {stage: dict(totals) for stage, totals in stages.items()} for unit, stages in self.units.items()},
+            }
+        if extra:
+            report.update(extra)
+        return report
+
+    def write_report(self, outpath: str, extra: Union[Dict[str, Any], None] = None) -> None:
+        with open(outpath, "w", encoding="utf-8") as outfile:
+            json.dump(self.get_report(extra), outfile, indent=2)
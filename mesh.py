@@ -0,0 +1,103 @@
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("numpy not found (pip install numpy)")
+from typing import List, Tuple
+
+# builds an indexed quad mesh from a set of 1x1x1 voxels
+# only faces next to an empty voxel are kept (hidden face culling) and coplanar faces are then merged greedily,
+# first into strips along one axis and then strips of the same extent into rectangles along the other
+# voxels outside of the given set are treated as empty so meshing chunks separately leaves faces at chunk borders
+
+KEY_BITS: int = 21
+KEY_MASK: int = (1 << KEY_BITS) - 1
+
+def pack_keys(positions: np.ndarray) -> np.ndarray:
+    return positions[:, 0] << (KEY_BITS * 2) | positions[:, 1] << KEY_BITS | positions[:, 2]
+
+# returns the exposed faces as (plane, u, v) for each of the 6 directions in (axis, sign) order
+def get_exposed_faces(positions: np.ndarray) -> List[Tuple[int, int, np.ndarray]]:
+    keys: np.ndarray = np.unique(pack_keys(positions))
+    positions = np.column_stack((keys >> (KEY_BITS * 2), keys >> KEY_BITS & KEY_MASK, keys & KEY_MASK))
+    faces: List[Tuple[int, int, np.ndarray]] = []
+    for axis in range(3):
+        stride: int = 1 << (KEY_BITS * (2 - axis))
+        # u and v are chosen so that u x v points along +axis
+        u: int = (axis + 1) % 3
+        v: int = (axis + 2) % 3
+        for sign in (1, -1):
+            neighbors: np.ndarray = keys + sign * stride
+            idx: np.ndarray = np.minimum(np.searchsorted(keys, neighbors), len(keys) - 1)
+            exposed: np.ndarray = keys[idx] != neighbors
+            visible: np.ndarray = positions[exposed]
+            plane: np.ndarray = visible[:, axis] + (1 if sign > 0 else 0)
+            faces.append((axis, sign, np.column_stack((plane, visible[:, u], visible[:, v]))))
+    return faces
+
+# sorts rows by the given columns (most significant first), packing them into a single integer key when they fit
+# since that's considerably faster than lexsort
+def sort_rows(rows: np.ndarray, columns: Tuple[int, ...]) -> np.ndarray:
+    bits: List[int] = [max(int(rows[:, column].max()).bit_length(), 1) for column in columns]
+    if sum(bits) > 63:
+        return rows[np.lexsort(tuple(rows[:, column] for column in reversed(columns)))]
+    key: np.ndarray = np.zeros(len(rows), dtype=np.int64)
+    for column, size in zip(columns, bits):
+        key = key << size | rows[:, column]
+    return rows[np.argsort(key)]
+
+# merges (plane, u, v) unit faces into (plane, u, v, u_length, v_length) rectangles
+def merge_faces(faces: np.ndarray) -> np.ndarray:
+    if len(faces) == 0:
+        return np.empty((0, 5), dtype=np.int64)
+    # strips along u
+    faces = sort_rows(faces, (0, 2, 1))
+    starts: np.ndarray = np.ones(len(faces), dtype=bool)
+    starts[1:] = (faces[1:, 0] != faces[:-1, 0]) | (faces[1:, 2] != faces[:-1, 2]) | (faces[1:, 1] != faces[:-1, 1] + 1)
+    start_idx: np.ndarray = np.flatnonzero(starts)
+    strips: np.ndarray = np.column_stack((faces[start_idx], np.diff(np.append(start_idx, len(faces)))))
+    # strips with the same plane, start and length stacked along v
+    strips = sort_rows(strips, (0, 1, 3, 2))
+    starts = np.ones(len(strips), dtype=bool)
+    starts[1:] = (strips[1:, 0] != strips[:-1, 0]) | (strips[1:, 1] != strips[:-1, 1]) \
+        | (strips[1:, 3] != strips[:-1, 3]) | (strips[1:, 2] != strips[:-1, 2] + 1)
+    start_idx = np.flatnonzero(starts)
+    return np.column_stack((strips[start_idx], np.diff(np.append(start_idx, len(strips)))))
+
+# returns (V, 3) int32 vertices and (F, 4) uint32 quads (counter-clockwise when seen from outside)
+# positions are the minimum corners of voxel_size sized cubes which must all lie on the same grid
+def mesh_voxels(positions: np.ndarray, greedy: bool = True, voxel_size: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    positions = np.asarray(positions, dtype=np.int64).reshape(-1, 3)
+    if len(positions) == 0:
+        return np.empty((0, 3), dtype=np.int32), np.empty((0, 4), dtype=np.uint32)
+    # shift so that every neighbor key is non-negative
+    origin: np.ndarray = positions.min(axis=0)
+    corners: List[np.ndarray] = []
+    for axis, sign, faces in get_exposed_faces((positions - origin) // voxel_size + 1):
+        if greedy:
+            quads: np.ndarray = merge_faces(faces)
+        else:
+            quads: np.ndarray = np.column_stack((faces, np.ones((len(faces), 2), dtype=np.int64)))
+        u: int = (axis + 1) % 3
+        v: int = (axis + 2) % 3
+        quad_corners: np.ndarray = np.empty((len(quads), 4, 3), dtype=np.int64)
+        quad_corners[:, :, axis] = quads[:, 0, None]
+        u0, v0 = quads[:, 1], quads[:, 2]
+        u1, v1 = u0 + quads[:, 3], v0 + quads[:, 4]
+        quad_corners[:, :, u] = np.column_stack((u0, u1, u1, u0))
+        quad_corners[:, :, v] = np.column_stack((v0, v0, v1, v1))
+        if sign < 0:
+            quad_corners = quad_corners[:, ::-1]
+        corners.append(quad_corners)
+    all_corners: np.ndarray = np.concatenate(corners).reshape(-1, 3)
+    vertices, indices = np.unique(pack_keys(all_corners), return_inverse=True)
+    vertices = np.column_stack((vertices >> (KEY_BITS * 2), vertices >> KEY_BITS & KEY_MASK, vertices & KEY_MASK))
+    vertices = (vertices - 1) * voxel_size + origin
+    return vertices.astype(np.int32), indices.reshape(-1, 4).astype(np.uint32)
+
+# concatenates (vertices, faces) meshes into one
+def merge_meshes(meshes: List[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    if not meshes:
+        return np.empty((0, 3), dtype=np.int32), np.empty((0, 4), dtype=np.uint32)
+    offsets: np.ndarray = np.cumsum([0] + [len(vertices) for vertices, faces in meshes[:-1]])
+    return np.concatenate([vertices for vertices, faces in meshes]), \
+        np.concatenate([faces + np.uint32(offset) for (vertices, faces), offset in zip(meshes, offsets)])
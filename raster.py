@@ -0,0 +1,86 @@
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("numpy not found (pip install numpy)")
+from typing import Callable, Dict, List, Tuple, Union
+import os
+
+# top-down per-column maps of a unit, every raster is indexed [z, x] relative to the unit base
+# height is the y of the highest floor voxel (surface_info bit 2) in the column and every other product is taken from
+# the WorldInfo of the 4x4x4 node containing that voxel (single scene units have no WorldInfo so only height is set)
+
+# height of columns without any floor voxel
+NO_HEIGHT: int = -0x8000
+
+# product -> (dtype, fill value)
+RASTER_PRODUCTS: Dict[str, Tuple[np.dtype, int]] = {
+    "height": (np.int16, NO_HEIGHT),
+    "water_depth": (np.uint8, 0),
+    "material": (np.uint8, 0),
+    "forest_type": (np.uint8, 0),
+    "forest_density": (np.uint8, 0),
+    "miasma": (np.uint8, 0),
+}
+
+# product -> WorldInfo records -> values
+WORLD_INFO_PRODUCTS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "water_depth": lambda info: info["water_depth"],
+    "material": lambda info: info["tera_mat"],
+    "forest_type": lambda info: info["forest_type_flags"] & 0x1f,
+    "forest_density": lambda info: info["forest_density"],
+    "miasma": lambda info: info["surface_flags"] >> 7 & 1,
+}
+
+def make_rasters(width: int, depth: int) -> Dict[str, np.ndarray]:
+    return {name: np.full((depth, width), fill, dtype=dtype) for name, (dtype, fill) in RASTER_PRODUCTS.items()}
+
+# merges a batch of floor voxels into the rasters, columns are flat indices (z * width + x) into the rasters
+# world_info holds the WorldInfo record of each voxel's 4x4x4 node or is None if the unit has none
+def update_rasters(rasters: Dict[str, np.ndarray], columns: np.ndarray, heights: np.ndarray,
+                   world_info: Union[np.ndarray, None] = None) -> None:
+    if len(columns) == 0:
+        return
+    # sort by (column, height) with a packed key and keep the last (highest) voxel of every column
+    keys: np.ndarray = np.asarray(columns, dtype=np.int64) << 16 | (np.asarray(heights, dtype=np.int64) - NO_HEIGHT)
+    order: np.ndarray = np.argsort(keys)
+    sorted_columns: np.ndarray = columns[order]
+    last: np.ndarray = np.ones(len(order), dtype=bool)
+    last[:-1] = sorted_columns[1:] != sorted_columns[:-1]
+    top: np.ndarray = order[last]
+    top_columns: np.ndarray = columns[top]
+    height: np.ndarray = rasters["height"].reshape(-1)
+    higher: np.ndarray = heights[top] > height[top_columns]
+    top, top_columns = top[higher], top_columns[higher]
+    height[top_columns] = heights[top]
+    if world_info is None:
+        return
+    info: np.ndarray = world_info[top]
+    for name, get_values in WORLD_INFO_PRODUCTS.items():
+        rasters[name].reshape(-1)[top_columns] = get_values(info)
+
+# halves the resolution, every 2x2 block takes all of its values from the cell with the highest floor
+# odd sizes are padded with empty columns
+def downsample_rasters(rasters: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    depth, width = rasters["height"].shape
+    pad: Tuple[Tuple[int, int], Tuple[int, int]] = ((0, depth & 1), (0, width & 1))
+    padded: Dict[str, np.ndarray] = {
+        name: np.pad(raster, pad, constant_values=RASTER_PRODUCTS[name][1]) for name, raster in rasters.items()
+    }
+    depth, width = (depth + 1) // 2, (width + 1) // 2
+    def blocks(raster: np.ndarray) -> np.ndarray:
+        return raster.reshape(depth, 2, width, 2).transpose(0, 2, 1, 3).reshape(depth, width, 4)
+    choice: np.ndarray = blocks(padded["height"]).argmax(axis=2)[:, :, None]
+    return {name: np.take_along_axis(blocks(raster), choice, axis=2)[:, :, 0] for name, raster in padded.items()}
+
+# writes <outdir>/<product>/<level>/<name>.npy for levels 0 (full resolution) to levels - 1
+def save_raster_pyramid(rasters: Dict[str, np.ndarray], outdir: str, name: str, levels: int = 1) -> List[str]:
+    paths: List[str] = []
+    for level in range(levels):
+        if level > 0:
+            rasters = downsample_rasters(rasters)
+        for product, raster in rasters.items():
+            tile_dir: str = os.path.join(outdir, product, str(level))
+            os.makedirs(tile_dir, exist_ok=True)
+            paths.append(os.path.join(tile_dir, f"{name}.npy"))
+            np.save(paths[-1], raster)
+    return paths
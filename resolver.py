@@ -0,0 +1,47 @@
+from typing import Dict, List, Sequence, Tuple
+import os
+import re
+
+UNIT_FILENAME: re.Pattern = re.compile(r"^X(\d+)_Z(\d+)\.vsts\.zs$")
+
+class UnitResolver:
+    # indexes VolumeStats/<world> once instead of checking every unit x gamedata flag on disk
+    # base units live in the world directory, units swapped out by GameData flags live in a subdirectory named after
+    # the flag (the game gets this from the vstats WorldParam file but the directory layout mirrors it)
+    def __init__(self, world_dir: str) -> None:
+        self.world_dir = world_dir
+        # (x, z, flag) -> path, flag is "" for base units
+        self.paths: Dict[Tuple[int, int, str], str] = {}
+        if os.path.isdir(world_dir):
+            self.scan()
+
+    def scan(self) -> None:
+        with os.scandir(self.world_dir) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    with os.scandir(entry.path) as flag_entries:
+                        for flag_entry in flag_entries:
+                            self.add(flag_entry, entry.name)
+                else:
+                    self.add(entry, "")
+
+    def add(self, entry: os.DirEntry, flag: str) -> None:
+        match: re.Match = UNIT_FILENAME.match(entry.name)
+        if match is not None and entry.is_file():
+            self.paths[(int(match.group(1)), int(match.group(2)), flag)] = entry.path
+
+    # returns the path for the first flag in flags that has a variant of the unit (and that flag) or the base unit
+    # the base path is returned even if it doesn't exist so callers fail with the expected file name
+    def resolve(self, x: int, z: int, flags: Sequence[str]) -> Tuple[str, str]:
+        for flag in flags:
+            path: str = self.paths.get((x, z, flag), "")
+            if path:
+                return path, flag
+        return self.paths.get((x, z, ""), os.path.join(self.world_dir, f"X{x}_Z{z}.vsts.zs")), ""
+
+    # flags that have a variant of the given unit
+    def get_variants(self, x: int, z: int) -> List[str]:
+        return sorted(flag for (unit_x, unit_z, flag) in self.paths if unit_x == x and unit_z == z and flag)
+
+    def get_flags(self) -> List[str]:
+        return sorted({flag for (x, z, flag) in self.paths if flag})
@@ -1,6 +1,8 @@
 from utils import *
 import os
 import io
+import mmap
+import struct
 
 class Sarc:
     # Takes a SARC file, directory, or raw bytes as input
@@ -182,4 +184,124 @@ class Sarc:
             output += files[i]
             if i < len(files) - 1:
                 output += ', '
-        return output
\ No newline at end of file
+        return output
+
+# Read-only SARC reader that doesn't copy anything up front
+# Only the headers are parsed, file data is returned as memoryview slices of the input when requested and
+# named lookups binary search the SFAT nodes (sorted by name hash) so opening is O(1) in the archive size
+# Takes a SARC file path (memory-mapped), bytes or any other buffer (bytearray, memoryview, mmap)
+class SarcReader:
+    def __init__(self, data, filename=''):
+        if isinstance(data, (str, os.PathLike)):
+            self.filename = os.path.basename(data)
+            with open(data, 'rb') as file:
+                # mapping an empty file fails, let the magic check report it instead
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(file.fileno()).st_size else b''
+        else:
+            self.filename = filename
+        self.buffer = data
+        self.view = memoryview(data).cast('B')
+
+        self.magic = bytes(self.view[0:4]).decode('utf-8')
+        assert self.magic == "SARC", f"Invalid file magic, expected 'SARC' but got '{self.magic}'"
+        self.bom = "<" if struct.unpack_from(">H", self.view, 6)[0] == 65534 else ">"
+        self.header_size, _, self.filesize, self.data_offset, self.version = struct.unpack_from(f"{self.bom}HHIIH", self.view, 4)
+        assert self.header_size == 0x14, f"Invalid header size, expected 0x14 but but got {hex(self.header_size)}"
+        assert self.version == 0x100, f"Invalid version, expected 0x100 but got {hex(self.version)}"
+
+        # SFAT Header
+        self.sfat_magic = bytes(self.view[self.header_size:self.header_size + 4]).decode('utf-8')
+        assert self.sfat_magic == "SFAT", f"Invalid SFAT magic, expected 'SFAT' but got '{self.sfat_magic}'"
+        self.sfat_header_size, self.file_count, self.hash_mult = struct.unpack_from(f"{self.bom}HHI", self.view, self.header_size + 4)
+        assert self.sfat_header_size == 0x0c, f"Invalid SFAT header size, expected 0x0c but got {hex(self.sfat_header_size)}"
+        if self.file_count > 0x3FFF:
+            raise ValueError("Archive contains more than the maximum amount of 16,383 files")
+        assert self.hash_mult == 101, f"Hash multiplier in official files must be 101, got {self.hash_mult}"
+        # Nodes are (hash, collision flag << 24 | filename offset / 4, data start, data end)
+        self.node_offset = self.header_size + self.sfat_header_size
+        self.node = struct.Struct(f"{self.bom}IIII")
+
+        # SFNT Header
+        sfnt_offset = self.node_offset + self.file_count * self.node.size
+        if self.data_offset < sfnt_offset:
+            raise ValueError("Data section must come after SFNT section")
+        self.sfnt_magic = bytes(self.view[sfnt_offset:sfnt_offset + 4]).decode('utf-8')
+        assert self.sfnt_magic == "SFNT", f"Invalid SFNT magic, expected 'SFNT' but got '{self.sfnt_magic}'"
+        self.sfnt_header_size = struct.unpack_from(f"{self.bom}H", self.view, sfnt_offset + 4)[0]
+        assert self.sfnt_header_size == 0x08, f"Invalid SFNT header size, expected 0x08 but got {hex(self.sfnt_header_size)}"
+        self.name_table_offset = sfnt_offset + self.sfnt_header_size
+        self.size = len(self.view)
+
+    # Same filename hash as Sarc
+    Hash = Sarc.Hash
+
+    def __len__(self):
+        return self.file_count
+
+    def __contains__(self, name):
+        return self.FindNode(name) >= 0
+
+    def __getitem__(self, name):
+        index = self.FindNode(name)
+        if index < 0:
+            raise KeyError(name)
+        return self.GetData(index)
+
+    def GetNode(self, index):
+        return self.node.unpack_from(self.view, self.node_offset + index * self.node.size)
+
+    def GetName(self, index):
+        name_and_flags = self.GetNode(index)[1]
+        start = self.name_table_offset + (name_and_flags & 0xffffff) * 4
+        end = start
+        # Names are null terminated, scan in chunks since memoryviews can't be searched directly
+        while True:
+            chunk = bytes(self.view[end:end + 0x100])
+            terminator = chunk.find(b'\x00')
+            if terminator >= 0 or len(chunk) == 0:
+                end += terminator if terminator >= 0 else len(chunk)
+                break
+            end += len(chunk)
+        return bytes(self.view[start:end]).decode('utf-8')
+
+    def GetData(self, index):
+        node = self.GetNode(index)
+        return self.view[self.data_offset + node[2]:self.data_offset + node[3]]
+
+    # Returns the node index of the file or -1 if it isn't in the archive
+    def FindNode(self, name):
+        hash = self.Hash(name)
+        low, high = 0, self.file_count
+        while low < high:
+            mid = (low + high) // 2
+            if self.GetNode(mid)[0] < hash:
+                low = mid + 1
+            else:
+                high = mid
+        # Names with colliding hashes are stored next to each other
+        while low < self.file_count and self.GetNode(low)[0] == hash:
+            if self.GetName(low) == name:
+                return low
+            low += 1
+        return -1
+
+    # Returns a memoryview of the file's data or None if it isn't in the archive
+    def GetFile(self, name):
+        index = self.FindNode(name)
+        return self.GetData(index) if index >= 0 else None
+
+    # Yields (name, data) for every file in node order
+    def IterFiles(self):
+        for i in range(self.file_count):
+            yield self.GetName(i), self.GetData(i)
+
+    # Returns a list of all files in archive
+    def ListFiles(self):
+        return [self.GetName(i) for i in range(self.file_count)]
+
+    # For RESTBL
+    def ListFileInfo(self):
+        return {name: len(data) for name, data in self.IterFiles()}
+
+    def __repr__(self):
+        return ', '.join(self.ListFiles())
@@ -0,0 +1,163 @@
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("numpy not found (pip install numpy)")
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Union
+import json
+
+# voxel statistics that can be merged in any order, so units can be reduced in parallel and combined afterwards
+# every count is in voxels (1x1x1), the attributes of 2x2x2 and 4x4x4 nodes count once for every voxel below them
+
+# histogram -> WorldInfo records -> values (0-255)
+WORLD_INFO_HISTOGRAMS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "tera_mat": lambda info: info["tera_mat"],
+    "material": lambda info: info["material"],
+    "water_depth": lambda info: info["water_depth"],
+    "water_flow_rate": lambda info: info["water_flow_rate"],
+    "forest_type": lambda info: info["forest_type_flags"] & 0x1f,
+    "forest_type_flags": lambda info: info["forest_type_flags"],
+    "forest_density": lambda info: info["forest_density"],
+    "surface_flags": lambda info: info["surface_flags"],
+    "cave_or_indoor_distance": lambda info: info["cave_or_indoor_distance"],
+    "cave_entrance_distance": lambda info: info["cave_entrance_distance"],
+    "water_distance": lambda info: info["water_distance"],
+    "route_dist": lambda info: info["route_dist"],
+}
+
+# volume (in voxels) and bounds of every cave_id, sorted by id, high is exclusive
+@dataclass
+class CaveStats:
+    ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.uint64))
+    volume: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    low: np.ndarray = field(default_factory=lambda: np.empty((0, 3), dtype=np.int32))
+    high: np.ndarray = field(default_factory=lambda: np.empty((0, 3), dtype=np.int32))
+
+    # combines entries with the same id
+    @staticmethod
+    def reduce(ids: np.ndarray, volume: np.ndarray, low: np.ndarray, high: np.ndarray) -> "CaveStats":
+        if len(ids) == 0:
+            return CaveStats()
+        order: np.ndarray = np.argsort(ids, kind="stable")
+        ids = ids[order]
+        starts: np.ndarray = np.flatnonzero(np.concatenate(([True], ids[1:] != ids[:-1])))
+        return CaveStats(
+            ids[starts],
+            np.add.reduceat(volume[order], starts),
+            np.minimum.reduceat(low[order], starts, axis=0),
+            np.maximum.reduceat(high[order], starts, axis=0)
+        )
+
+    @staticmethod
+    def from_voxels(ids: np.ndarray, positions: np.ndarray) -> "CaveStats":
+        positions = np.asarray(positions, dtype=np.int32)
+        return CaveStats.reduce(np.asarray(ids, dtype=np.uint64), np.ones(len(ids), dtype=np.int64), positions,
+                                positions + 1)
+
+    def merge(self, other: "CaveStats") -> "CaveStats":
+        return CaveStats.reduce(
+            np.concatenate((self.ids, other.ids)),
+            np.concatenate((self.volume, other.volume)),
+            np.concatenate((self.low, other.low)),
+            np.concatenate((self.high, other.high))
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            str(id): {"volume": volume, "low": low, "high": high} for id, volume, low, high in zip(
+                self.ids.tolist(), self.volume.tolist(), self.low.tolist(), self.high.tolist()
+            )
+        }
+
+@dataclass
+class VoxelStats:
+    voxels: int = 0
+    # voxels with surface_info bit 2 set, the top surface area in voxel faces
+    floor_voxels: int = 0
+    # floor voxels in miasma (surface_flags bit 7) 4x4x4 nodes
+    miasma_surface: int = 0
+    # voxels by their full surface_info (10 bit) and surface_info2 (6 bit) values
+    surface_info: np.ndarray = field(default_factory=lambda: np.zeros(0x400, dtype=np.int64))
+    surface_info2: np.ndarray = field(default_factory=lambda: np.zeros(0x40, dtype=np.int64))
+    # WORLD_INFO_HISTOGRAMS name -> voxels by value, empty for single scene units (no WorldInfo)
+    world_info: Dict[str, np.ndarray] = field(default_factory=dict)
+    caves: CaveStats = field(default_factory=CaveStats)
+
+    # surface_info, surface_info2 and info_index (into world_info) are per voxel, surface_info2 and world_info are None
+    # for single scene units
+    def add_voxels(self, surface_info: np.ndarray, surface_info2: Union[np.ndarray, None],
+                   world_info: Union[np.ndarray, None], info_index: np.ndarray) -> None:
+        self.voxels += len(surface_info)
+        self.surface_info += np.bincount(surface_info, minlength=0x400)
+        floor: np.ndarray = (surface_info >> 2 & 1).astype(bool)
+        self.floor_voxels += int(np.count_nonzero(floor))
+        if surface_info2 is not None:
+            self.surface_info2 += np.bincount(surface_info2, minlength=0x40)
+        if world_info is None or len(info_index) == 0:
+            return
+        # count voxels per record once, the histograms are then built from the (much shorter) record array
+        counts: np.ndarray = np.bincount(info_index, minlength=len(world_info))
+        for name, get_values in WORLD_INFO_HISTOGRAMS.items():
+            histogram: np.ndarray = np.bincount(get_values(world_info), weights=counts, minlength=0x100)
+            if name in self.world_info:
+                self.world_info[name] += histogram.astype(np.int64)
+            else:
+                self.world_info[name] = histogram.astype(np.int64)
+        miasma: np.ndarray = (world_info["surface_flags"] >> 7 & 1).astype(bool)
+        self.miasma_surface += int(np.count_nonzero(miasma[info_index[floor]]))
+
+    def add_caves(self, ids: np.ndarray, positions: np.ndarray) -> None:
+        if len(ids) != 0:
+            self.caves = self.caves.merge(CaveStats.from_voxels(ids, positions))
+
+    def merge(self, other: "VoxelStats") -> "VoxelStats":
+        self.voxels += other.voxels
+        self.floor_voxels += other.floor_voxels
+        self.miasma_surface += other.miasma_surface
+        self.surface_info += other.surface_info
+        self.surface_info2 += other.surface_info2
+        for name, histogram in other.world_info.items():
+            if name in self.world_info:
+                self.world_info[name] += histogram
+            else:
+                self.world_info[name] = histogram.copy()
+        self.caves = self.caves.merge(other.caves)
+        return self
+
+    # voxels in 4x4x4 nodes with the given surface_flags bit set (6 is water, 7 is miasma)
+    def get_flag_voxels(self, bit: int) -> int:
+        if "surface_flags" not in self.world_info:
+            return 0
+        return int(self.world_info["surface_flags"][(np.arange(0x100) >> bit & 1).astype(bool)].sum())
+
+    @staticmethod
+    def get_histogram_dict(histogram: np.ndarray) -> Dict[str, int]:
+        return {str(value): int(histogram[value]) for value in np.flatnonzero(histogram)}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "voxels": self.voxels,
+            "floor_voxels": self.floor_voxels,
+            "water_voxels": self.get_flag_voxels(6),
+            "miasma_voxels": self.get_flag_voxels(7),
+            "miasma_surface": self.miasma_surface,
+            "surface_info": self.get_histogram_dict(self.surface_info),
+            "surface_info2": self.get_histogram_dict(self.surface_info2),
+            "world_info": {name: self.get_histogram_dict(histogram) for name, histogram in self.world_info.items()},
+            "caves": self.caves.to_dict(),
+        }
+
+@dataclass
+class WorldStats:
+    units: Dict[str, VoxelStats] # by unit name (X{x}_Z{z})
+    total: VoxelStats
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"total": self.total.to_dict(), "units": {name: stats.to_dict() for name, stats in self.units.items()}}
+
+    def write_json(self, outpath: str) -> None:
+        with open(outpath, "w", encoding="utf-8") as outfile:
+            json.dump(self.to_dict(), outfile, indent=2)
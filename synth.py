@@ -0,0 +1,304 @@
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("numpy not found (pip install numpy)")
+try:
+    import zstandard as zstd
+except ImportError:
+    raise ImportError("zstandard not found (pip install zstandard)")
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+import argparse
+import os
+import struct
+from vstats import WORLD_INFO_DTYPE
+
+# writes synthetic but structurally valid VolumeStats worlds (see vsts.hexpat and vsts_context.hexpat) so the decode
+# and export paths can be benchmarked without the game files
+# the terrain, flags and WorldInfo are pure functions of the world position and the seed, so the margins of
+# neighboring areas agree like they do in the game's files and regenerating a world gives identical output
+
+# values hardcoded by Context.init_defaults since MainField has no context file
+MAINFIELD_UNIT_SIZE: Tuple[int, int, int] = (500, 8000, 500)
+MAINFIELD_WORLD_BASE: Tuple[int, int, int] = (-5000, -4000, -4000)
+MAINFIELD_GRID: Tuple[int, int, int] = (20, 1, 16)
+AREA_MARGIN: Tuple[int, int, int] = (3, 3, 3)
+AREA_SIDELENGTH: int = 250
+TREE_SIZE: int = 0x100
+
+DICTIONARY_NAMES: Tuple[str, ...] = ("zs.zsdic", "bcett.byml.zsdic", "pack.zsdic")
+
+# fractions are of 4x4x4 nodes, the counts are the number of distinct values used
+@dataclass
+class WorldInfoDistribution:
+    water: float = 0.1
+    miasma: float = 0.02
+    cave: float = 0.05
+    caves: int = 4
+    forest_types: int = 8
+    materials: int = 16
+
+@dataclass
+class SynthConfig:
+    density: float = 0.8 # fraction of columns that contain terrain
+    thickness: int = 2 # voxels per terrain column
+    base_height: int = 200 # average terrain height above the world base
+    amplitude: int = 60
+    single_scene: bool = False # no surface_info2 or world_info
+    world_info: WorldInfoDistribution = field(default_factory=WorldInfoDistribution)
+    seed: int = 0
+
+@dataclass
+class WorldLayout:
+    unit_size: Tuple[int, int, int]
+    world_base: Tuple[int, int, int]
+    grid_dimensions: Tuple[int, int, int]
+    area_margin: Tuple[int, int, int] = AREA_MARGIN
+    area_sidelength: int = AREA_SIDELENGTH
+
+    def get_area_dims(self) -> Tuple[int, int, int]:
+        return tuple(self.unit_size[i] // self.area_sidelength for i in range(3))
+
+    def get_unit_base(self, x: int, z: int) -> Tuple[int, int, int]:
+        return (self.world_base[0] + self.unit_size[0] * x, self.world_base[1], self.world_base[2] + self.unit_size[2] * z)
+
+MAINFIELD_LAYOUT: WorldLayout = WorldLayout(MAINFIELD_UNIT_SIZE, MAINFIELD_WORLD_BASE, MAINFIELD_GRID)
+
+# uniform [0, 1) noise per integer position (splitmix64 finalizer), salt picks independent streams
+def get_noise(positions: np.ndarray, salt: int, seed: int) -> np.ndarray:
+    positions = np.asarray(positions, dtype=np.int64).reshape(-1, 3).astype(np.uint64)
+    value: np.ndarray = (positions[:, 0] * np.uint64(0x9e3779b97f4a7c15)) ^ (positions[:, 1] * np.uint64(0xc2b2ae3d27d4eb4f)) \
+        ^ (positions[:, 2] * np.uint64(0x165667b19e3779f9)) ^ np.uint64((seed * 0x100 + salt) & 0xffffffffffffffff)
+    value ^= value >> np.uint64(30)
+    value *= np.uint64(0xbf58476d1ce4e5b9)
+    value ^= value >> np.uint64(27)
+    value *= np.uint64(0x94d049bb133111eb)
+    value ^= value >> np.uint64(31)
+    return (value >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+def get_terrain_height(x: np.ndarray, z: np.ndarray, config: SynthConfig, layout: WorldLayout) -> np.ndarray:
+    phase: np.ndarray = get_noise([[config.seed, 0, 0], [config.seed, 1, 0]], 0, config.seed) * 2 * np.pi
+    wave: np.ndarray = 0.6 * np.sin(x / 37.0 + phase[0]) + 0.4 * np.cos(z / 29.0 + phase[1])
+    detail: np.ndarray = 0.15 * np.sin((x + z) / 7.0)
+    return (layout.world_base[1] + config.base_height + config.amplitude * (wave + detail)).astype(np.int64)
+
+# voxels of the 256^3 octree starting at tree_base (world space) relative to tree_base
+def get_area_voxels(tree_base: Sequence[int], config: SynthConfig, layout: WorldLayout) -> np.ndarray:
+    x, z = np.meshgrid(np.arange(TREE_SIZE) + tree_base[0], np.arange(TREE_SIZE) + tree_base[2], indexing="ij")
+    x, z = x.ravel(), z.ravel()
+    heights: np.ndarray = get_terrain_height(x, z, config, layout)
+    # skip the noise for columns that are outside of the tree vertically anyway
+    visible: np.ndarray = (heights >= tree_base[1]) & (heights - config.thickness < tree_base[1] + TREE_SIZE)
+    x, z, heights = x[visible], z[visible], heights[visible]
+    filled: np.ndarray = get_noise(np.column_stack((x, np.zeros_like(x), z)), 1, config.seed) < config.density
+    x, z, heights = x[filled], z[filled], heights[filled]
+    voxels: np.ndarray = np.concatenate([np.column_stack((x, heights - depth, z)) for depth in range(config.thickness)])
+    voxels -= np.asarray(tree_base, dtype=np.int64)
+    return voxels[np.all((voxels >= 0) & (voxels < TREE_SIZE), axis=1)]
+
+# builds the 8 levels of child masks for the given voxels (relative to the tree origin)
+# returns the masks, the voxels in octree order and the index of each voxel's 2x2x2 and 4x4x4 node
+def build_octree(voxels: np.ndarray) -> Tuple[List[np.ndarray], np.ndarray, np.ndarray, np.ndarray]:
+    voxels = np.asarray(voxels, dtype=np.int64)
+    # morton style key with the child flag (x | y << 1 | z << 2) of every level, most significant first
+    keys: np.ndarray = np.zeros(len(voxels), dtype=np.int64)
+    for level in range(8):
+        shift: int = 7 - level
+        child: np.ndarray = (voxels[:, 0] >> shift & 1) | (voxels[:, 1] >> shift & 1) << 1 | (voxels[:, 2] >> shift & 1) << 2
+        keys |= child << (3 * shift)
+    keys, first = np.unique(keys, return_index=True)
+    voxels = voxels[first]
+    # nodes of every depth, depth 0 is the root and depth 8 the voxels
+    nodes: List[np.ndarray] = [np.unique(keys >> (3 * (8 - depth))) for depth in range(8)] + [keys]
+    masks: List[np.ndarray] = []
+    for depth in range(8):
+        parents: np.ndarray = np.searchsorted(nodes[depth], nodes[depth + 1] >> 3)
+        bits: np.ndarray = np.zeros(len(nodes[depth]), dtype=np.int64)
+        np.bitwise_or.at(bits, parents, 1 << (nodes[depth + 1] & 7))
+        # children are stored contiguously in key order so the offset is the index of the first one
+        first_child: np.ndarray = np.searchsorted(parents, np.arange(len(nodes[depth])))
+        masks.append((first_child << 8 | bits).astype("<u4"))
+    node2: np.ndarray = np.searchsorted(nodes[7], keys >> 3)
+    node4: np.ndarray = np.searchsorted(nodes[6], keys >> 6)
+    return masks, voxels, node2, node4
+
+# packs values into a little endian bitfield with size bits per entry
+def pack_bits(values: np.ndarray, size: int) -> np.ndarray:
+    bits: np.ndarray = (np.asarray(values, dtype=np.int64)[:, None] >> np.arange(size) & 1).astype(np.uint8).ravel()
+    return np.packbits(bits, bitorder="little")
+
+def get_surface_info(voxels: np.ndarray, tree_base: Sequence[int], config: SynthConfig,
+                     layout: WorldLayout) -> np.ndarray:
+    world: np.ndarray = voxels + np.asarray(tree_base, dtype=np.int64)
+    heights: np.ndarray = get_terrain_height(world[:, 0], world[:, 2], config, layout)
+    info: np.ndarray = np.zeros(len(voxels), dtype=np.int64)
+    info |= (world[:, 1] == heights).astype(np.int64) << 2 # floor
+    info |= (world[:, 1] == heights - config.thickness + 1).astype(np.int64) << 3 # ceiling
+    # side faces and the remaining flags are noise
+    for bit, chance in ((0, 0.2), (1, 0.2), (4, 0.2), (5, 0.2), (6, 0.05), (7, 0.05), (8, 0.02), (9, 0.05)):
+        info |= (get_noise(world, 2 + bit, config.seed) < chance).astype(np.int64) << bit
+    return info
+
+def get_world_info(nodes: np.ndarray, face_bits: np.ndarray, config: SynthConfig) -> np.ndarray:
+    distribution: WorldInfoDistribution = config.world_info
+    def noise(salt: int) -> np.ndarray:
+        return get_noise(nodes, 0x20 + salt, config.seed)
+    def byte(salt: int, count: int = 0x100) -> np.ndarray:
+        return (noise(salt) * count).astype(np.int64)
+    water: np.ndarray = noise(0) < distribution.water
+    miasma: np.ndarray = noise(1) < distribution.miasma
+    cave: np.ndarray = noise(2) < distribution.cave
+    info: np.ndarray = np.zeros(len(nodes), dtype=WORLD_INFO_DTYPE)
+    info["cave_or_indoor_distance"] = np.where(cave, byte(3), 0)
+    info["water_distance"] = byte(4)
+    info["forest_density"] = byte(5)
+    info["surface_flags"] = face_bits | water << 6 | miasma << 7
+    info["cave_entrance_distance"] = byte(6)
+    info["material"] = byte(7, max(distribution.materials, 1)) & 0xf
+    info["route_dist"] = byte(8)
+    info["water_depth"] = np.where(water, 1 + byte(9, 32), 0)
+    info["water_flow_rate"] = np.where(water, byte(10), 0)
+    info["tera_mat"] = byte(11, max(distribution.materials, 1))
+    info["forest_type_flags"] = byte(12, max(distribution.forest_types, 1)) | (noise(13) < 0.1) << 6 | (noise(14) < 0.1) << 7
+    info["cave_id"] = np.where(cave, 1 + byte(15, max(distribution.caves, 1)), 0)
+    return info
+
+def write_res_array(values: np.ndarray, count: int) -> bytes:
+    return struct.pack("<I", count) + values.tobytes()
+
+def get_area_bytes(tree_base: Sequence[int], config: SynthConfig, layout: WorldLayout) -> bytes:
+    voxels: np.ndarray = get_area_voxels(tree_base, config, layout)
+    if len(voxels) == 0:
+        masks: List[np.ndarray] = [np.empty(0, dtype="<u4")] * 8
+        node2: np.ndarray = np.empty(0, dtype=np.int64)
+        node4: np.ndarray = np.empty(0, dtype=np.int64)
+    else:
+        masks, voxels, node2, node4 = build_octree(voxels)
+    node_data: bytes = b"".join(write_res_array(level, len(level)) for level in masks)
+    data: bytearray = bytearray(struct.pack("<I", len(node_data)) + node_data)
+    surface_info: np.ndarray = get_surface_info(voxels, tree_base, config, layout)
+    packed: np.ndarray = pack_bits(surface_info, 10)
+    data += write_res_array(packed, len(packed))
+    if not config.single_scene:
+        count2: int = int(node2.max()) + 1 if len(node2) else 0
+        count4: int = int(node4.max()) + 1 if len(node4) else 0
+        # the 2x2x2 and 4x4x4 face flags are the union of the faces below them
+        face2: np.ndarray = np.zeros(count2, dtype=np.int64)
+        np.bitwise_or.at(face2, node2, surface_info & 0x3f)
+        face4: np.ndarray = np.zeros(count4, dtype=np.int64)
+        np.bitwise_or.at(face4, node4, surface_info & 0x3f)
+        packed = pack_bits(face2, 6)
+        data += write_res_array(packed, len(packed))
+        # world space minimum corner of every 4x4x4 node
+        first: np.ndarray = np.searchsorted(node4, np.arange(count4))
+        nodes: np.ndarray = (voxels[first] & ~3) + np.asarray(tree_base, dtype=np.int64)
+        data += write_res_array(get_world_info(nodes, face4, config), count4)
+    return bytes(data)
+
+def get_unit_bytes(x: int, z: int, config: SynthConfig, layout: WorldLayout) -> bytes:
+    area_dims: Tuple[int, int, int] = layout.get_area_dims()
+    unit_base: Tuple[int, int, int] = layout.get_unit_base(x, z)
+    data: bytearray = bytearray(b"VSTS" + struct.pack("<BBBB", area_dims[0] * area_dims[1] * area_dims[2],
+                                                      config.single_scene, 0, 0xa))
+    # areas are arranged in X -> Z -> Y order
+    for area_y in range(area_dims[1]):
+        for area_z in range(area_dims[2]):
+            for area_x in range(area_dims[0]):
+                area_pos: Tuple[int, int, int] = (area_x, area_y, area_z)
+                tree_base: List[int] = [
+                    unit_base[i] + layout.area_sidelength * area_pos[i] - layout.area_margin[i] for i in range(3)
+                ]
+                data += get_area_bytes(tree_base, config, layout)
+    return bytes(data)
+
+def get_context_bytes(layout: WorldLayout) -> bytes:
+    return b"VSTS" + struct.pack("<I3iI3iI3iI3ii", 0, *layout.unit_size, 0, *layout.world_base, 0,
+                                 *layout.grid_dimensions, 0, *layout.area_margin, layout.area_sidelength)
+
+# same hash as sarc.Sarc.Hash
+def get_name_hash(name: str) -> int:
+    hash: int = 0
+    for byte in name.encode("utf-8"):
+        hash = (hash * 101 + byte) & 0xffffffff
+    return hash
+
+# minimal little endian SARC writer
+def get_sarc_bytes(files: Dict[str, bytes]) -> bytes:
+    names: List[str] = sorted(files, key=get_name_hash)
+    name_table: bytearray = bytearray()
+    data: bytearray = bytearray()
+    nodes: bytearray = bytearray()
+    for name in names:
+        name_offset: int = len(name_table)
+        name_table += name.encode("utf-8") + b"\x00"
+        name_table += b"\x00" * (-len(name_table) % 4)
+        data += b"\x00" * (-len(data) % 8)
+        nodes += struct.pack("<IIII", get_name_hash(name), 0x01000000 | name_offset // 4, len(data), len(data) + len(files[name]))
+        data += files[name]
+    headers: bytes = b"SFAT" + struct.pack("<HHI", 0xc, len(names), 101) + nodes + b"SFNT" + struct.pack("<HH", 8, 0) + name_table
+    data_offset: int = 0x14 + len(headers) + (-(0x14 + len(headers)) % 8)
+    return b"SARC" + struct.pack("<HHIIHH", 0x14, 0xfeff, data_offset + len(data), data_offset, 0x100, 0) \
+        + headers + b"\x00" * (data_offset - 0x14 - len(headers)) + bytes(data)
+
+# Pack/ZsDic.pack.zs with placeholder dictionaries, units are compressed without one
+def write_dictionaries(romfs_path: str, seed: int = 0) -> None:
+    rng: np.random.Generator = np.random.default_rng(seed)
+    files: Dict[str, bytes] = {name: rng.integers(0, 0x100, 0x1000, dtype=np.uint8).tobytes() for name in DICTIONARY_NAMES}
+    os.makedirs(os.path.join(romfs_path, "Pack"), exist_ok=True)
+    with open(os.path.join(romfs_path, "Pack", "ZsDic.pack.zs"), "wb") as outfile:
+        outfile.write(zstd.ZstdCompressor().compress(get_sarc_bytes(files)))
+
+# writes romfs_path/VolumeStats/<world_name> (and the dictionary pack), returns the written unit paths
+# units defaults to the whole grid, variants maps a GameData flag to the units that get a variant (generated with a
+# different seed) in the flag's subdirectory
+def write_world(romfs_path: str, world_name: str, config: SynthConfig, layout: WorldLayout,
+                units: Sequence[Tuple[int, int]] = (), variants: Dict[str, Sequence[Tuple[int, int]]] = {},
+                level: int = 3) -> List[str]:
+    write_dictionaries(romfs_path, config.seed)
+    world_dir: str = os.path.join(romfs_path, "VolumeStats", world_name)
+    os.makedirs(world_dir, exist_ok=True)
+    cctx: zstd.ZstdCompressor = zstd.ZstdCompressor(level=level)
+    if world_name != "MainField":
+        with open(os.path.join(world_dir, "context.vsts.zs"), "wb") as outfile:
+            outfile.write(cctx.compress(get_context_bytes(layout)))
+    if not units:
+        units = [(x, z) for x in range(layout.grid_dimensions[0]) for z in range(layout.grid_dimensions[2])]
+    jobs: List[Tuple[str, int, int, SynthConfig]] = [(world_dir, x, z, config) for x, z in units]
+    for i, (flag, flag_units) in enumerate(variants.items()):
+        variant_config: SynthConfig = SynthConfig(**{**config.__dict__, "seed": config.seed + i + 1})
+        jobs.extend((os.path.join(world_dir, flag), x, z, variant_config) for x, z in flag_units)
+    paths: List[str] = []
+    for outdir, x, z, unit_config in jobs:
+        os.makedirs(outdir, exist_ok=True)
+        paths.append(os.path.join(outdir, f"X{x}_Z{z}.vsts.zs"))
+        with open(paths[-1], "wb") as outfile:
+            outfile.write(cctx.compress(get_unit_bytes(x, z, unit_config, layout)))
+    return paths
+
+if __name__ == "__main__":
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Write a synthetic VolumeStats world")
+    parser.add_argument("romfs_path")
+    parser.add_argument("world_name")
+    parser.add_argument("--grid", type=int, nargs=2, default=(2, 2), metavar=("X", "Z"))
+    parser.add_argument("--unit-size", type=int, nargs=3, default=(500, 500, 500), metavar=("X", "Y", "Z"))
+    parser.add_argument("--world-base", type=int, nargs=3, default=(-500, -4000, -500), metavar=("X", "Y", "Z"))
+    parser.add_argument("--units", type=int, nargs=2, action="append", metavar=("X", "Z"),
+                        help="only write these units (default: the whole grid)")
+    parser.add_argument("--density", type=float, default=0.8)
+    parser.add_argument("--thickness", type=int, default=2)
+    parser.add_argument("--base-height", type=int, default=200)
+    parser.add_argument("--single-scene", action="store_true")
+    parser.add_argument("--water", type=float, default=0.1)
+    parser.add_argument("--miasma", type=float, default=0.02)
+    parser.add_argument("--cave", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args: argparse.Namespace = parser.parse_args()
+
+    if args.world_name == "MainField":
+        layout: WorldLayout = MAINFIELD_LAYOUT
+    else:
+        layout: WorldLayout = WorldLayout(tuple(args.unit_size), tuple(args.world_base), (args.grid[0], 1, args.grid[1]))
+    config: SynthConfig = SynthConfig(args.density, args.thickness, args.base_height, single_scene=args.single_scene,
+                                      world_info=WorldInfoDistribution(args.water, args.miasma, args.cave), seed=args.seed)
+    for path in write_world(args.romfs_path, args.world_name, config, layout, [tuple(unit) for unit in args.units or []]):
+        print(path)
@@ -1,12 +1,45 @@
-import struct
+import array
 import io
+import mmap
+import struct
+import sys
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 def get_string(data, offset):
+    if isinstance(data, ReadStream):
+        # Same as reading the rest of the stream (including leaving it at the end) without copying it
+        string = data.get_string_at(data.tell() + offset)
+        data.seek(0, 2)
+        return string
     if type(data) != bytes:
         data = data.read()
     end = data.find(b'\x00', offset)
     return data[offset:end].decode('utf-8')
 
+# struct.Struct objects for one format by byte order character, created on first use
+class StructCache(dict):
+    __slots__ = ["fmt"]
+
+    def __init__(self, fmt) -> None:
+        super().__init__()
+        self.fmt = fmt
+
+    def __missing__(self, end):
+        self[end] = struct.Struct(end + self.fmt)
+        return self[end]
+
+U16 = StructCache("H")
+S16 = StructCache("h")
+U32 = StructCache("I")
+S32 = StructCache("i")
+U64 = StructCache("Q")
+S64 = StructCache("q")
+F32 = StructCache("f")
+F64 = StructCache("d")
+
 class Stream:
     __slots__ = ["stream"]
 
@@ -22,61 +55,120 @@ class Stream:
     def skip(self, skip_size) -> None:
         self.stream.seek(skip_size, 1)
 
+# Reads directly from a memoryview of data (bytes or any other buffer such as an mmap) with unpack_from instead of
+# copying every read out of a BytesIO
 class ReadStream(Stream):
     def __init__(self, data) -> None:
-        stream = io.BytesIO(memoryview(data))
-        super().__init__(stream)
+        # there is no separate underlying stream anymore, .stream is kept for code that reaches into it
+        super().__init__(self)
         self.data = data
+        self.view = memoryview(data).cast('B')
+        self.pos = 0
+
+    def seek(self, offset, whence=0) -> int:
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += len(self.view)
+        assert offset >= 0, f"Negative seek position {offset}"
+        self.pos = offset
+        return self.pos
+
+    def tell(self) -> int:
+        return self.pos
+
+    def skip(self, skip_size) -> None:
+        self.pos += skip_size
+
+    def read(self, size=-1) -> bytes:
+        start = self.pos
+        self.pos = len(self.view) if size is None or size < 0 else min(start + size, len(self.view))
+        return bytes(self.view[start:self.pos])
+
+    def read_value(self, structs, end):
+        s = structs[end]
+        pos = self.pos
+        self.pos = pos + s.size
+        return s.unpack_from(self.view, pos)[0]
 
-    def read(self, *args) -> bytes:
-        return self.stream.read(*args)
-    
     def read_u8(self, end="<") -> int:
-        return struct.unpack(f"{end}B", self.read(1))[0]
-    
+        pos = self.pos
+        self.pos = pos + 1
+        return self.view[pos]
+
     def read_u16(self, end="<") -> int:
-        return struct.unpack(f"{end}H", self.read(2))[0]
-    
+        pos = self.pos
+        self.pos = pos + 2
+        return U16[end].unpack_from(self.view, pos)[0]
+
     def read_s16(self, end="<") -> int:
-        return struct.unpack(f"{end}h", self.read(2))[0]
-    
+        return self.read_value(S16, end)
+
     def read_u24(self, end="<") -> int:
-        if end == "<":
-            return struct.unpack(f"{end}I", self.read(3) + b'\x00')[0]
-        else:
-            return struct.unpack(f"{end}I", b'\x00' + self.read(3))[0]
-        
+        return int.from_bytes(self.read(3), "little" if end == "<" else "big")
+
     def read_s24(self, end="<") -> int:
-        if end == "<":
-            return struct.unpack(f"{end}i", self.read(3) + b'\x00')[0]
-        else:
-            return struct.unpack(f"{end}i", b'\x00' + self.read(3))[0]
-    
+        return int.from_bytes(self.read(3), "little" if end == "<" else "big", signed=True)
+
+    # the most common reads are inlined
     def read_u32(self, end="<") -> int:
-        return struct.unpack(f"{end}I", self.read(4))[0]
-    
+        pos = self.pos
+        self.pos = pos + 4
+        return U32[end].unpack_from(self.view, pos)[0]
+
     def read_s32(self, end="<") -> int:
-        return struct.unpack(f"{end}i", self.read(4))[0]
-    
+        pos = self.pos
+        self.pos = pos + 4
+        return S32[end].unpack_from(self.view, pos)[0]
+
     def read_u64(self, end="<") -> int:
-        return struct.unpack(f"{end}Q", self.read(8))[0]
-    
+        return self.read_value(U64, end)
+
     def read_s64(self, end="<") -> int:
-        return struct.unpack(f"{end}q", self.read(8))[0]
-    
+        return self.read_value(S64, end)
+
     def read_ptr(self, align=8, end="<") -> int:
-        while self.stream.tell() % align != 0:
-            self.read(1)
-        return struct.unpack(f"{end}Q", self.read(8))[0]
-    
+        self.pos += -self.pos % align
+        return self.read_value(U64, end)
+
     def read_f32(self, end="<") -> float:
-        return struct.unpack(f"{end}f", self.read(4))[0]
-    
+        return self.read_value(F32, end)
+
     def read_f64(self, end="<") -> float:
-        return struct.unpack(f"{end}d", self.read(4))[0]
+        return self.read_value(F64, end)
+
+    # Reads count elements at once, returns a read-only numpy view into data (numpy dtypes keep their own byte order,
+    # plain ones use end) or an array.array copy for struct format characters if numpy isn't installed
+    def read_array(self, dtype, count, end="<"):
+        if np is not None:
+            dt = np.dtype(dtype)
+            if dt.byteorder == '=':
+                dt = dt.newbyteorder(end)
+            values = np.frombuffer(self.view, dtype=dt, count=count, offset=self.pos)
+            self.pos += values.nbytes
+            return values
+        values = array.array(dtype)
+        size = values.itemsize * count
+        assert self.pos + size <= len(self.view), "Read past the end of the stream"
+        values.frombytes(self.view[self.pos:self.pos + size])
+        if values.itemsize > 1 and end != ("<" if sys.byteorder == "little" else ">"):
+            values.byteswap()
+        self.pos += size
+        return values
+
+    # Null terminated string at an absolute offset, doesn't move the stream
+    def get_string_at(self, offset) -> str:
+        if isinstance(self.data, (bytes, bytearray, mmap.mmap)):
+            end = self.data.find(b'\x00', offset)
+        else:
+            # memoryviews can't be searched directly
+            end = bytes(self.view[offset:]).find(b'\x00') + offset
+        if end < offset:
+            end = len(self.view)
+        return bytes(self.view[offset:end]).decode('utf-8')
 
     def read_string(self, offset=None, size=4): # Data should be a slice beginning at the string pool
-        pos = self.stream.tell()
+        pos = self.pos
         if offset == None:
             if size == 4:
                 ptr = self.read_u32()
@@ -88,6 +180,7 @@ class ReadStream(Stream):
                 raise Exception("Please provide relative offset for other data sizes")
         else:
             ptr = offset
-        string = get_string(self.stream, ptr)
-        self.stream.seek(pos)
-        return string
\ No newline at end of file
+        # the offset is relative to the position after the pointer, like reading the rest of the stream
+        string = self.get_string_at(self.pos + ptr)
+        self.pos = pos
+        return string
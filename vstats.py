@@ -1,7 +1,25 @@
 from utils import *
 from zstd import *
+from cache import DiskCache, UnitCache
+from exporters import EXPORTERS, Exporter, get_exporter, get_mesh_exporter
+from instrument import Instrumentation
+from mesh import merge_meshes, mesh_voxels
+from raster import make_rasters, save_raster_pyramid, update_rasters
+from resolver import UNIT_FILENAME, UnitResolver
+from stats import VoxelStats, WorldStats
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("numpy not found (pip install numpy)")
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import math
 import os
-from typing import List, Tuple
+import re
+import shutil
+import tempfile
+import time
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Sequence, Tuple, Union
 from dataclasses import dataclass
 
 def u8_popcount(value: int) -> int:
@@ -14,7 +32,175 @@ def read_bits(index: int, values: List[int], size: int) -> int:
     idx: int = bit_offset >> 3
     shift: int = bit_offset & 7
     # assume bit_offset is even and size will not overflow into 3 bytes
-    return ((values[idx] & 0xff) >> shift | (values[idx + 1] & 0xff) << (8 - shift)) & ((1 << size) - 1)
+    # the last entry may end in the final byte of the bitfield so there isn't always a next byte
+    high: int = int(values[idx + 1]) & 0xff if idx + 1 < len(values) else 0
+    return ((int(values[idx]) & 0xff) >> shift | high << (8 - shift)) & ((1 << size) - 1)
+
+# vectorized read_bits, values must be (or convert to) a uint8 array
+def read_bits_array(indices: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    values = np.asarray(values, dtype=np.uint8)
+    bit_offset: np.ndarray = np.asarray(indices, dtype=np.int64) * size
+    idx: np.ndarray = bit_offset >> 3
+    shift: np.ndarray = (bit_offset & 7).astype(np.uint32)
+    low: np.ndarray = values[idx].astype(np.uint32)
+    # the last entry may end in the final byte of the bitfield so there isn't always a next byte
+    next_idx: np.ndarray = idx + 1
+    high: np.ndarray = np.where(next_idx < len(values), values[np.minimum(next_idx, len(values) - 1)], 0).astype(np.uint32)
+    return ((low >> shift | high << (8 - shift)) & ((1 << size) - 1)).astype(np.uint16)
+
+POPCOUNT_LUT: np.ndarray = np.array([u8_popcount(i) for i in range(0x100)], dtype=np.uint32)
+# bits below each child flag, used to get the child's rank among its siblings
+LOWER_BITS: np.ndarray = np.array([(1 << i) - 1 for i in range(8)], dtype=np.uint32)
+CHILD_BITS: np.ndarray = np.arange(8, dtype=np.uint32)
+# child flag i -> (x, y, z) offset in units of the child size
+CHILD_OFFSETS: np.ndarray = np.array([[i & 1, i >> 1 & 1, i >> 2 & 1] for i in range(8)], dtype=np.int32)
+
+# expands every node in masks into its present children, returns the child positions and the child indices
+# (into the next level's masks or, for level 7, into the per-voxel surface info)
+# children are emitted in (parent, child flag) order so the output matches the depth-first order of iterate_octree
+def expand_octree_level(masks: np.ndarray, positions: np.ndarray, level: int) -> Tuple[np.ndarray, np.ndarray]:
+    masks = masks[:, None]
+    present: np.ndarray = (masks >> CHILD_BITS & 1).astype(bool)
+    children: np.ndarray = (positions[:, None, :] + CHILD_OFFSETS * (1 << (7 - level)))[present]
+    indices: np.ndarray = (POPCOUNT_LUT[masks & LOWER_BITS] + (masks >> 8))[present]
+    return children, indices
+
+# same child indices as expand_octree_level without the positions, the parent of child i is
+# np.repeat(range(len(masks)), POPCOUNT_LUT[masks & 0xff])[i]
+# the children of a node are stored contiguously from mask >> 8 so each node just adds a range
+def expand_octree_indices(masks: np.ndarray) -> np.ndarray:
+    counts: np.ndarray = POPCOUNT_LUT[masks & 0xff].astype(np.int64)
+    ends: np.ndarray = np.cumsum(counts)
+    if len(ends) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.repeat((masks >> 8).astype(np.int64) - (ends - counts), counts) + np.arange(ends[-1])
+
+# a pruner is called with (level, child positions, child indices) after each level is expanded and returns which
+# children to keep (or None to keep all of them), pruned children are never descended into
+Pruner = Callable[[int, np.ndarray, np.ndarray], Union[np.ndarray, None]]
+
+# keeps children whose cube intersects the box [low, high)
+# the octrees of neighboring areas are offset from each other so coarse cubes crossing the edge of an area's box are
+# kept too, neighboring areas then emit overlapping cubes there instead of leaving a gap
+def get_box_pruner(low: Sequence[int], high: Sequence[int]) -> Pruner:
+    low_arr: np.ndarray = np.asarray(low, dtype=np.int64)
+    high_arr: np.ndarray = np.asarray(high, dtype=np.int64)
+    def prune(level: int, positions: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        size: int = 1 << (7 - level)
+        return np.all((positions < high_arr) & (positions + size > low_arr), axis=1)
+    return prune
+
+# size of the cubes emitted when decoding down to max_level
+def get_voxel_size(max_level: int) -> int:
+    assert 0 <= max_level <= 7, f"Invalid octree level {max_level}"
+    return 1 << (7 - max_level)
+
+# breadth-first decode of an area's octree one level at a time, returns an (N, 3) int32 array of voxel positions
+# max_level stops the decode early (level of detail), each occupied node is then emitted as a single cube of
+# get_voxel_size(max_level) with its minimum corner as the position
+# pruners are applied down to prune_level even if it's below max_level (see decode_subtrees)
+def decode_octree(voxel_masks: List[np.ndarray], base_pos: List[int], pruners: Sequence[Pruner] = (),
+                  max_level: int = 7, prune_level: int = 0) -> np.ndarray:
+    if len(voxel_masks[0]) == 0:
+        return np.empty((0, 3), dtype=np.int32)
+    return decode_subtrees(voxel_masks, np.array([base_pos], dtype=np.int32), np.zeros(1, dtype=np.uint32), 0,
+                           pruners, max_level, prune_level)
+
+# expands the given nodes (positions are their minimum corners and indices point into voxel_masks[level]) through the
+# given levels and returns the positions and indices of their descendants after the last one
+# carry holds extra per-node arrays (e.g. an ancestor's index) that are repeated for every child and returned along
+# with them, without positions (None) the children are expanded by index alone and pruners aren't called
+def expand_octree(voxel_masks: List[np.ndarray], positions: Union[np.ndarray, None], indices: np.ndarray,
+                  levels: Iterable[int], pruners: Sequence[Pruner] = (),
+                  carry: Sequence[np.ndarray] = ()) -> Tuple[Union[np.ndarray, None], np.ndarray, List[np.ndarray]]:
+    carried: List[np.ndarray] = list(carry)
+    for level in levels:
+        masks: np.ndarray = np.asarray(voxel_masks[level], dtype=np.uint32)[indices]
+        if carried:
+            counts: np.ndarray = POPCOUNT_LUT[masks & 0xff]
+            carried = [np.repeat(values, counts) for values in carried]
+        if positions is None:
+            indices = expand_octree_indices(masks)
+            continue
+        positions, indices = expand_octree_level(masks, positions, level)
+        for prune in pruners:
+            keep: Union[np.ndarray, None] = prune(level, positions, indices)
+            if keep is not None:
+                positions, indices = positions[keep], indices[keep]
+                carried = [values[keep] for values in carried]
+    return positions, indices, carried
+
+# decodes the subtrees below the given nodes, positions are the nodes' minimum corners and indices point into
+# voxel_masks[level]
+# if prune_level is below max_level, the decode keeps descending to it and only the nodes at max_level with a
+# descendant that's kept by all pruners are returned
+def decode_subtrees(voxel_masks: List[np.ndarray], positions: np.ndarray, indices: np.ndarray, level: int,
+                    pruners: Sequence[Pruner] = (), max_level: int = 7, prune_level: int = 0) -> np.ndarray:
+    positions, indices, _ = expand_octree(voxel_masks, positions, indices, range(level, max_level + 1), pruners)
+    if prune_level <= max_level:
+        return positions
+    # index of every descendant's ancestor in positions
+    _, _, (roots,) = expand_octree(voxel_masks, positions, indices, range(max_level + 1, prune_level + 1), pruners,
+                                   [np.arange(len(positions))])
+    return positions[np.unique(roots)]
+
+# expand_octree_level for pairs of nodes at the same position in two octrees, returns the positions of the children
+# present in either tree, whether each is present in the first and second tree and the child indices in both trees
+# (only meaningful where the child is present)
+def expand_octree_pairs(masks_a: np.ndarray, masks_b: np.ndarray, positions: np.ndarray,
+                        level: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    masks_a, masks_b = masks_a[:, None], masks_b[:, None]
+    present_a: np.ndarray = (masks_a >> CHILD_BITS & 1).astype(bool)
+    present_b: np.ndarray = (masks_b >> CHILD_BITS & 1).astype(bool)
+    present: np.ndarray = present_a | present_b
+    children: np.ndarray = (positions[:, None, :] + CHILD_OFFSETS * (1 << (7 - level)))[present]
+    indices_a: np.ndarray = (POPCOUNT_LUT[masks_a & LOWER_BITS] + (masks_a >> 8))[present]
+    indices_b: np.ndarray = (POPCOUNT_LUT[masks_b & LOWER_BITS] + (masks_b >> 8))[present]
+    return children, present_a[present], present_b[present], indices_a, indices_b
+
+# which pairs of nodes at the same position in two octrees (indices point into voxel_masks[level] of each area) have
+# identical subtrees, i.e. the same child flags and attributes on every level below them
+# the descendants of a node are stored contiguously on every level so the subtrees are compared range by range without
+# expanding any positions, every stored node is assumed to have at least one child
+def get_identical_subtrees(area_a: "Area", area_b: "Area", indices_a: np.ndarray, indices_b: np.ndarray,
+                           level: int) -> np.ndarray:
+    identical: np.ndarray = np.zeros(len(indices_a), dtype=bool)
+    # pairs that haven't differed yet and the start and size of their descendants' range on the current level
+    # (the same size in both areas as long as the child flags above matched)
+    pairs: np.ndarray = np.arange(len(indices_a))
+    low_a: np.ndarray = indices_a.astype(np.int64)
+    low_b: np.ndarray = indices_b.astype(np.int64)
+    counts: np.ndarray = np.ones(len(pairs), dtype=np.int64)
+    # level 8 is the voxels
+    for level in range(level, 9):
+        if len(pairs) == 0:
+            break
+        ends: np.ndarray = np.cumsum(counts)
+        owners: np.ndarray = np.repeat(np.arange(len(pairs)), counts)
+        offsets: np.ndarray = np.arange(ends[-1]) - np.repeat(ends - counts, counts)
+        nodes_a: np.ndarray = low_a[owners] + offsets
+        nodes_b: np.ndarray = low_b[owners] + offsets
+        # single scene units have no surface_info2 or world_info, those are not compared if either side is missing them
+        if level < 8:
+            masks_a: np.ndarray = np.asarray(area_a.voxel_masks[level], dtype=np.uint32)[nodes_a]
+            masks_b: np.ndarray = np.asarray(area_b.voxel_masks[level], dtype=np.uint32)[nodes_b]
+            differs: np.ndarray = (masks_a ^ masks_b) & 0xff != 0
+        else:
+            differs = read_bits_array(nodes_a, area_a.surface_info, 10) != read_bits_array(nodes_b, area_b.surface_info, 10)
+        if level == 6 and len(area_a.world_info) != 0 and len(area_b.world_info) != 0:
+            differs |= np.asarray(area_a.world_info)[nodes_a] != np.asarray(area_b.world_info)[nodes_b]
+        elif level == 7 and len(area_a.surface_info2) != 0 and len(area_b.surface_info2) != 0:
+            differs |= read_bits_array(nodes_a, area_a.surface_info2, 6) != read_bits_array(nodes_b, area_b.surface_info2, 6)
+        same: np.ndarray = np.bincount(owners[differs], minlength=len(pairs)) == 0
+        if level == 8:
+            identical[pairs[same]] = True
+            break
+        # the next range starts at the first child of the first node in this one
+        first: np.ndarray = ends - counts
+        counts = np.bincount(owners, weights=POPCOUNT_LUT[masks_a & 0xff], minlength=len(pairs)).astype(np.int64)
+        low_a, low_b = (masks_a[first] >> 8).astype(np.int64), (masks_b[first] >> 8).astype(np.int64)
+        pairs, low_a, low_b, counts = pairs[same], low_a[same], low_b[same], counts[same]
+    return identical
 
 @dataclass
 class WorldInfo:
@@ -33,16 +219,213 @@ class WorldInfo:
     _0b: int # maybe padding
     cave_id: int
 
+# matches ResWorldInfo in vsts.hexpat, used when loading units as arrays
+WORLD_INFO_DTYPE: np.dtype = np.dtype([
+    ("cave_or_indoor_distance", "u1"),
+    ("water_distance", "u1"),
+    ("forest_density", "u1"),
+    ("surface_flags", "u1"),
+    ("cave_entrance_distance", "u1"),
+    ("material", "u1"),
+    ("route_dist", "u1"),
+    ("water_depth", "u1"),
+    ("water_flow_rate", "u1"),
+    ("tera_mat", "u1"),
+    ("forest_type_flags", "u1"),
+    ("_0b", "u1"),
+    ("cave_id", "<u8"),
+])
+assert WORLD_INFO_DTYPE.itemsize == 0x14, "WorldInfo size mismatch!"
+
+@dataclass
+class QueryResult:
+    occupied: bool
+    # level whose mask was missing the queried child (8 if occupied), the empty node covers 2^(7 - level) units
+    level: int
+    surface_info: int = 0 # 10 bit flags of the 1x1x1 voxel, see vsts.hexpat
+    surface_info2: int = 0 # 6 bit flags of the 2x2x2 voxel
+    world_info: Union[WorldInfo, None] = None # info of the 4x4x4 voxel
+
+@dataclass
+class RaycastResult:
+    hit: bool
+    distance: float = 0.0 # along the normalized direction to where the ray enters the hit voxel
+    voxel: Tuple[int, int, int] = (0, 0, 0)
+    normal: Tuple[int, int, int] = (0, 0, 0) # face the ray entered the voxel through, zero if it started inside it
+    surface_info: int = 0
+    surface_info2: int = 0
+    world_info: Union[WorldInfo, None] = None
+
+# when loaded as arrays, every field is a read-only numpy view into the decompressed unit
 @dataclass
 class Area:
     pos: Tuple[int, int, int]
-    voxel_masks: List[List[int]]
-    surface_info: List[int]
-    surface_info2: List[int]
-    world_info: List[WorldInfo]
+    voxel_masks: Union[List[List[int]], List[np.ndarray]]
+    surface_info: Union[List[int], np.ndarray]
+    surface_info2: Union[List[int], np.ndarray]
+    world_info: Union[List[WorldInfo], np.ndarray]
+
+# positions are the minimum corners of the changed nodes (voxels for surface_info, 2x2x2 nodes for surface_info2 and
+# 4x4x4 nodes for world_info), old and new hold the entries from the base and the variant unit
+@dataclass
+class AttributeDiff:
+    positions: np.ndarray
+    old: np.ndarray
+    new: np.ndarray
+
+@dataclass
+class UnitDiff:
+    added: np.ndarray # (N, 3) voxels only present in the variant
+    removed: np.ndarray # (N, 3) voxels only present in the base unit
+    surface_info: AttributeDiff
+    surface_info2: AttributeDiff
+    world_info: AttributeDiff
+    changed_areas: List[Tuple[int, int, int]] # areas whose data differs at all
+
+# predicates take the whole array of entries for the children of a level and return a bool mask
+# world_info is checked at level 5 (4x4x4 nodes), surface_info2 at level 6 (2x2x2) and surface_info at level 7 (voxels)
+# so non-matching subtrees are skipped as early as possible
+# areas without the data a predicate needs (single scene units have no surface_info2 or world_info) never match
+@dataclass
+class VoxelFilter:
+    world_info: Union[Callable[[np.ndarray], np.ndarray], None] = None
+    surface_info2: Union[Callable[[np.ndarray], np.ndarray], None] = None
+    surface_info: Union[Callable[[np.ndarray], np.ndarray], None] = None
+
+    def __and__(self, other: "VoxelFilter") -> "VoxelFilter":
+        def combine(a, b):
+            if a is None or b is None:
+                return a if b is None else b
+            return lambda values: a(values) & b(values)
+        return VoxelFilter(
+            combine(self.world_info, other.world_info),
+            combine(self.surface_info2, other.surface_info2),
+            combine(self.surface_info, other.surface_info)
+        )
+
+    @staticmethod
+    def water() -> "VoxelFilter":
+        return VoxelFilter(world_info=lambda info: info["surface_flags"] >> 6 & 1 != 0)
+
+    @staticmethod
+    def miasma() -> "VoxelFilter":
+        return VoxelFilter(world_info=lambda info: info["surface_flags"] >> 7 & 1 != 0)
+
+    @staticmethod
+    def cave(cave_id: int) -> "VoxelFilter":
+        return VoxelFilter(world_info=lambda info: info["cave_id"] == cave_id)
+
+    @staticmethod
+    def forest_type(forest_type: int) -> "VoxelFilter":
+        return VoxelFilter(world_info=lambda info: info["forest_type_flags"] & 0x1f == forest_type)
+
+    # surface_info bit 2
+    @staticmethod
+    def floor() -> "VoxelFilter":
+        return VoxelFilter(surface_info=lambda flags: flags >> 2 & 1 != 0)
+
+    def get_pruner(self, area: Area) -> Pruner:
+        def prune(level: int, positions: np.ndarray, indices: np.ndarray) -> Union[np.ndarray, None]:
+            if level == 5 and self.world_info is not None:
+                if len(area.world_info) == 0:
+                    return np.zeros(len(indices), dtype=bool)
+                return self.world_info(np.asarray(area.world_info)[indices])
+            elif level == 6 and self.surface_info2 is not None:
+                if len(area.surface_info2) == 0:
+                    return np.zeros(len(indices), dtype=bool)
+                return self.surface_info2(read_bits_array(indices, area.surface_info2, 6))
+            elif level == 7 and self.surface_info is not None:
+                return self.surface_info(read_bits_array(indices, area.surface_info, 10))
+            return None
+        return prune
+
+# reads a u32 prefixed array as a view into data, returns the array and the offset past it
+def read_res_array(data: bytes, offset: int, dtype: np.dtype) -> Tuple[np.ndarray, int]:
+    count: int = struct.unpack_from("<I", data, offset)[0]
+    array: np.ndarray = np.frombuffer(data, dtype=dtype, count=count, offset=offset + 4)
+    return array, offset + 4 + array.nbytes
+
+class Unit:
+    # every area is prefixed by its size so the unit can be indexed without decoding anything
+    # areas are only parsed the first time they're accessed via unit[x, y, z], each section is mapped directly
+    # onto data (bytes or a memory-mapped cache file) without copying
+    def __init__(self, ctx: "Context", data: bytes, offsets: Union[List[int], None] = None, path: str = "") -> None:
+        self.ctx = ctx
+        self.data = data
+        # file the unit was opened from (if any), instrumentation events are keyed by it
+        self.path = path
+        self.is_single_scene, self.area_dims = ctx.read_unit_header(ReadStream(data))
+        self.offsets: List[int] = self.index_areas() if offsets is None else offsets
+        assert len(self.offsets) == self.area_dims[0] * self.area_dims[1] * self.area_dims[2], "Mismatching area count!"
+        self.areas: Dict[int, Area] = {}
+
+    def index_areas(self) -> List[int]:
+        offsets: List[int] = []
+        pos: int = 8
+        for i in range(self.area_dims[0] * self.area_dims[1] * self.area_dims[2]):
+            offsets.append(pos)
+            pos += 4 + struct.unpack_from("<I", self.data, pos)[0] # node data
+            pos += 4 + struct.unpack_from("<I", self.data, pos)[0] # surface info
+            if not self.is_single_scene:
+                pos += 4 + struct.unpack_from("<I", self.data, pos)[0] # surface info 2
+                pos += 4 + struct.unpack_from("<I", self.data, pos)[0] * WORLD_INFO_DTYPE.itemsize
+        assert pos <= len(self.data), "Truncated unit!"
+        return offsets
+
+    # same layout as Context.load_area
+    def load_area(self, index: int, x: int, y: int, z: int) -> Area:
+        size: int = struct.unpack_from("<I", self.data, self.offsets[index])[0]
+        pos: int = self.offsets[index] + 4
+        voxel_masks: List[np.ndarray] = []
+        for i in range(8):
+            masks, pos = read_res_array(self.data, pos, "<u4")
+            voxel_masks.append(masks)
+        assert pos - self.offsets[index] - 4 == size, "Incorrect size!"
+        surface_info, pos = read_res_array(self.data, pos, np.uint8)
+        if self.is_single_scene:
+            surface_info2: np.ndarray = np.empty(0, dtype=np.uint8)
+            world_info: np.ndarray = np.empty(0, dtype=WORLD_INFO_DTYPE)
+        else:
+            surface_info2, pos = read_res_array(self.data, pos, np.uint8)
+            world_info, pos = read_res_array(self.data, pos, WORLD_INFO_DTYPE)
+        return Area((x, y, z), voxel_masks, surface_info, surface_info2, world_info)
+
+    # raw bytes of an area (up to the next area), used to compare areas without parsing them
+    def get_area_data(self, index: int) -> np.ndarray:
+        end: int = self.offsets[index + 1] if index + 1 < len(self.offsets) else len(self.data)
+        return np.frombuffer(self.data, dtype=np.uint8, count=end - self.offsets[index], offset=self.offsets[index])
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    # octree nodes stored in all areas, parses every area
+    def get_node_count(self) -> int:
+        return sum(len(masks) for area in self for masks in area.voxel_masks)
+
+    # decoded size, the area arrays are views into this buffer
+    @property
+    def nbytes(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, pos: Tuple[int, int, int]) -> Area:
+        x, y, z = pos
+        if not (0 <= x < self.area_dims[0] and 0 <= y < self.area_dims[1] and 0 <= z < self.area_dims[2]):
+            raise IndexError(f"Area {pos} is out of range for unit with {self.area_dims} areas")
+        # areas are arranged in X -> Z -> Y order
+        index: int = (y * self.area_dims[2] + z) * self.area_dims[0] + x
+        if index not in self.areas:
+            self.areas[index] = self.load_area(index, x, y, z)
+        return self.areas[index]
+
+    def __iter__(self) -> Iterator[Area]:
+        for y in range(self.area_dims[1]):
+            for z in range(self.area_dims[2]):
+                for x in range(self.area_dims[0]):
+                    yield self[x, y, z]
 
 class Context:
-    def __init__(self, romfs_path: str, world_name: str, gamedata_flags: List[str]):
+    def __init__(self, romfs_path: str, world_name: str, gamedata_flags: List[str], cache_size: int = 0x40000000,
+                 cache_dir: str = "", instrumentation: Union[Instrumentation, None] = None):
         self.dctx = ZstdDecompContext(os.path.join(romfs_path, "Pack/ZsDic.pack.zs"))
         if world_name == "" or world_name == "MainField":
             self.init_defaults() # MainField has no context file, values are hardcoded
@@ -51,6 +434,27 @@ class Context:
         self.world_name = world_name
         self.romfs_path = romfs_path
         self.gamedata_flags = gamedata_flags
+        self.resolver: UnitResolver = UnitResolver(os.path.join(romfs_path, "VolumeStats", world_name))
+        # decoded units used by queries, keyed by (unit path, gamedata variant)
+        self.unit_cache: UnitCache = UnitCache(cache_size)
+        # decompressed units persisted across runs, disabled if no directory is given
+        self.cache_dir = cache_dir
+        self.disk_cache: Union[DiskCache, None] = DiskCache(cache_dir) if cache_dir else None
+        self.set_instrumentation(instrumentation)
+
+    # attaches (or detaches with None) per-unit and per-stage timings and counts, see instrument.py
+    # everything instrumented checks self.instrumentation first so there's no overhead while it's None
+    def set_instrumentation(self, instrumentation: Union[Instrumentation, None]) -> None:
+        self.instrumentation = instrumentation
+        self.dctx.instrumentation = instrumentation
+
+    def get_instrumentation_report(self) -> Dict:
+        assert self.instrumentation is not None, "Instrumentation is not enabled"
+        return self.instrumentation.get_report({"unit_cache": self.unit_cache.stats()})
+
+    def write_instrumentation_report(self, outpath: str) -> None:
+        assert self.instrumentation is not None, "Instrumentation is not enabled"
+        self.instrumentation.write_report(outpath, {"unit_cache": self.unit_cache.stats()})
 
     def init_defaults(self) -> None:
         self.unit_size = [500, 8000, 500]
@@ -66,17 +470,16 @@ class Context:
         magic: bytes = stream.read(4)
         assert magic == b"VSTS", f"Invalid file magic! {magic}"
         stream.read(4) # padding
-        self.unit_size = [stream.read_s32(), stream.read_s32(), stream.read_s32()]
+        self.unit_size = stream.read_array("<i4", 3).tolist()
         stream.read(4) # padding
-        self.world_base = [stream.read_s32(), stream.read_s32(), stream.read_s32()]
+        self.world_base = stream.read_array("<i4", 3).tolist()
         stream.read(4) # padding
-        self.grid_dimensions = [stream.read_s32(), stream.read_s32(), stream.read_s32()]
+        self.grid_dimensions = stream.read_array("<i4", 3).tolist()
         stream.read(4) # padding
-        self.area_margin = [stream.read_s32(), stream.read_s32(), stream.read_s32()]
+        self.area_margin = stream.read_array("<i4", 3).tolist()
         self.area_sidelength = stream.read_s32()
     
-    def load_unit(self, unit_path: str) -> List[Area]:
-        stream: ReadStream = ReadStream(self.dctx.decompress(unit_path))
+    def read_unit_header(self, stream: ReadStream) -> Tuple[bool, Tuple[int, int, int]]:
         magic: bytes = stream.read(4)
         assert magic == b"VSTS", f"Invalid file magic! {magic}"
         area_count: int = stream.read_u8()
@@ -88,6 +491,34 @@ class Context:
         num_area_y: int = int(self.unit_size[1] / self.area_sidelength)
         num_area_z: int = int(self.unit_size[2] / self.area_sidelength)
         assert area_count == num_area_x * num_area_y * num_area_z, "Mismatching area count!"
+        return is_single_scene, (num_area_x, num_area_y, num_area_z)
+
+    def open_unit(self, unit_path: str) -> "Unit":
+        if self.disk_cache is None:
+            return self.parse_unit(unit_path, self.dctx.decompress(unit_path))
+        key: str = self.disk_cache.get_key(unit_path)
+        cached: Union[Tuple[memoryview, List[int]], None] = self.disk_cache.load(key)
+        if self.instrumentation is not None:
+            self.instrumentation.count("disk_cache_hits" if cached is not None else "disk_cache_misses")
+        if cached is not None:
+            return self.parse_unit(unit_path, cached[0], cached[1])
+        unit: Unit = self.parse_unit(unit_path, self.dctx.decompress(unit_path))
+        self.disk_cache.store(key, unit.data, unit.offsets)
+        return unit
+
+    def parse_unit(self, unit_path: str, data: bytes, offsets: Union[List[int], None] = None) -> "Unit":
+        if self.instrumentation is None:
+            return Unit(self, data, offsets, unit_path)
+        start: float = time.perf_counter()
+        unit: Unit = Unit(self, data, offsets, unit_path)
+        self.instrumentation.add(unit_path, "parse", time.perf_counter() - start, bytes_in=len(data), areas=len(unit))
+        return unit
+
+    def load_unit(self, unit_path: str, as_arrays: bool = False) -> List[Area]:
+        if as_arrays:
+            return list(self.open_unit(unit_path))
+        stream: ReadStream = ReadStream(self.dctx.decompress(unit_path))
+        is_single_scene, (num_area_x, num_area_y, num_area_z) = self.read_unit_header(stream)
         areas: List[Area] = []
         # areas are arranged in X -> Z -> Y order
         for y in range(num_area_y):
@@ -102,50 +533,200 @@ class Context:
         area: Area = Area((x, y, z), self.load_voxel_masks(stream), [], [], [])
         assert stream.tell() - pos == size, "Incorrect size!"
         size = stream.read_u32()
-        area.surface_info.extend(struct.unpack(f"{size}B", stream.read(size)))
+        area.surface_info.extend(stream.read_array(np.uint8, size).tolist())
         if not is_single_scene:
             size = stream.read_u32()
-            area.surface_info2.extend(struct.unpack(f"{size}B", stream.read(size)))
-            for i in range(stream.read_u32()):
-                area.world_info.append(WorldInfo(*struct.unpack("<12BQ", stream.read(0x14))))
+            area.surface_info2.extend(stream.read_array(np.uint8, size).tolist())
+            size = stream.read_u32()
+            area.world_info.extend(WorldInfo(*info) for info in stream.read_array(WORLD_INFO_DTYPE, size).tolist())
         return area
     
     def load_voxel_masks(self, stream: ReadStream) -> List[List[int]]:
         masks: List[List[int]] = []
         for i in range(8):
-            masks.append([])
             count: int = stream.read_u32()
-            for j in range(count):
-                masks[i].append(stream.read_u32())
+            masks.append(stream.read_array("<u4", count).tolist())
         return masks
-    
-    def dump_unit_obj(self, unit_path: str, unit_base: List[int], outfile: io.FileIO) -> int:
-        areas: List[Area] = self.load_unit(unit_path)
-
-        positions: List[List[int]] = []
-
-        for area in areas:
-            base_pos: List[int] = [
-                self.area_sidelength * area.pos[0] - self.area_margin[0] + unit_base[0],
-                self.area_sidelength * area.pos[1] - self.area_margin[1] + unit_base[1],
-                self.area_sidelength * area.pos[2] - self.area_margin[2] + unit_base[2]
-            ]
-
-            if len(area.voxel_masks[0]) > 0:
-                self.iterate_octree(base_pos, positions, area, 0, 0)
-
-        for pos in positions:
-            outfile.write(f"v {pos[0]} {pos[1]} {pos[2]}\n")
-            # outfile.write(f"v {pos[0] + 1} {pos[1]} {pos[2]}\n")
-            # outfile.write(f"v {pos[0]} {pos[1]} {pos[2] + 1}\n")
-            # outfile.write(f"v {pos[0] + 1} {pos[1]} {pos[2] + 1}\n")
-            # outfile.write(f"v {pos[0]} {pos[1] + 1} {pos[2]}\n")
-            # outfile.write(f"v {pos[0] + 1} {pos[1] + 1} {pos[2]}\n")
-            # outfile.write(f"v {pos[0]} {pos[1] + 1} {pos[2] + 1}\n")
-            # outfile.write(f"v {pos[0] + 1} {pos[1] + 1} {pos[2] + 1}\n")
+
+    def get_area_base(self, area: Area, unit_base: List[int]) -> List[int]:
+        return [
+            self.area_sidelength * area.pos[0] - self.area_margin[0] + unit_base[0],
+            self.area_sidelength * area.pos[1] - self.area_margin[1] + unit_base[1],
+            self.area_sidelength * area.pos[2] - self.area_margin[2] + unit_base[2]
+        ]
+
+    # cube owned by the area in world space, the margin around it belongs to the neighboring areas
+    # margins on the edges of the world are outside of it and aren't owned by any area, same as for query
+    def get_area_bounds(self, area: Area, unit_base: List[int]) -> Tuple[List[int], List[int]]:
+        low: List[int] = [unit_base[i] + self.area_sidelength * area.pos[i] for i in range(3)]
+        high: List[int] = [low[i] + self.area_sidelength for i in range(3)]
+        return low, high
+
+    # box is an optional [low, high) world space box, children outside of it are skipped
+    # with owned_only, the box is clipped to the part of the area the area owns so the overlapping margins aren't
+    # emitted twice by neighboring areas (below max_level 7, cubes crossing the edge of the box still are, see
+    # get_box_pruner)
+    # with voxel_filter and max_level < 7, a coarse cube is kept if any voxel below it matches (and is inside the box)
+    def decode_area(self, area: Area, unit_base: List[int], voxel_filter: Union[VoxelFilter, None] = None,
+                    box: Union[Tuple[Sequence[int], Sequence[int]], None] = None, max_level: int = 7,
+                    owned_only: bool = True) -> np.ndarray:
+        pruners: List[Pruner] = []
+        prune_level: int = 0
+        if owned_only:
+            low, high = self.get_area_bounds(area, unit_base)
+            if box is not None:
+                low = [max(low[i], box[0][i]) for i in range(3)]
+                high = [min(high[i], box[1][i]) for i in range(3)]
+            box = (low, high)
+        if box is not None:
+            pruners.append(get_box_pruner(box[0], box[1]))
+        if voxel_filter is not None:
+            pruners.append(voxel_filter.get_pruner(area))
+            # descend to the voxels, a matching 4x4x4 node crossing the box may have no voxels inside of it
+            prune_level = 7
+        return decode_octree(area.voxel_masks, self.get_area_base(area, unit_base), pruners, max_level, prune_level)
+
+    def decode_unit(self, unit: Union[str, Unit], unit_base: List[int], voxel_filter: Union[VoxelFilter, None] = None,
+                    max_level: int = 7, owned_only: bool = True) -> np.ndarray:
+        if isinstance(unit, str):
+            unit = self.open_unit(unit)
+        start: float = time.perf_counter() if self.instrumentation is not None else 0.0
+        positions: List[np.ndarray] = [
+            self.decode_area(area, unit_base, voxel_filter, max_level=max_level, owned_only=owned_only) for area in unit
+        ]
+        result: np.ndarray = np.concatenate(positions) if positions else np.empty((0, 3), dtype=np.int32)
+        if self.instrumentation is not None:
+            self.instrumentation.add(unit.path, "traverse", time.perf_counter() - start, areas=len(unit),
+                                     nodes=unit.get_node_count(), voxels=len(result))
+        return result
+
+    # diffs a unit against a gamedata variant of it (e.g. the version swapped in after a divine beast is cleared)
+    # both octrees are walked together so only subtrees present in just one of them are decoded, areas with identical
+    # data are skipped without being parsed and unchanged subtrees of changed areas aren't walked (see diff_areas)
+    # unit_base defaults to the base of the unit named by base (the X{x}_Z{z} file name)
+    def diff_units(self, base: Union[str, Unit], variant: Union[str, Unit],
+                   unit_base: Union[List[int], None] = None) -> UnitDiff:
+        if unit_base is None:
+            match: Union[re.Match, None] = UNIT_FILENAME.match(os.path.basename(base)) if isinstance(base, str) else None
+            assert match is not None, "unit_base is required when base is not a unit path"
+            unit_base = self.get_unit_base(int(match.group(1)), int(match.group(2)))
+        if isinstance(base, str):
+            base = self.open_unit(base)
+        if isinstance(variant, str):
+            variant = self.open_unit(variant)
+        assert base.area_dims == variant.area_dims, f"Mismatching area dimensions {base.area_dims} and {variant.area_dims}"
+        added: List[np.ndarray] = []
+        removed: List[np.ndarray] = []
+        # surface_info, surface_info2, world_info -> (positions, old, new) chunks
+        changes: Tuple[Tuple[List[np.ndarray], List[np.ndarray], List[np.ndarray]], ...] = tuple(
+            ([], [], []) for i in range(3)
+        )
+        changed_areas: List[Tuple[int, int, int]] = []
+        dims: Tuple[int, int, int] = base.area_dims
+        for index in range(len(base)):
+            if np.array_equal(base.get_area_data(index), variant.get_area_data(index)):
+                continue
+            # areas are arranged in X -> Z -> Y order
+            pos: Tuple[int, int, int] = (index % dims[0], index // (dims[0] * dims[2]), index // dims[0] % dims[2])
+            changed_areas.append(pos)
+            self.diff_areas(base[pos], variant[pos], unit_base, added, removed, changes)
+        empty_pos: np.ndarray = np.empty((0, 3), dtype=np.int32)
+        attributes: List[AttributeDiff] = []
+        for (positions, old, new), dtype in zip(changes, (np.uint16, np.uint16, WORLD_INFO_DTYPE)):
+            attributes.append(AttributeDiff(
+                np.concatenate(positions) if positions else empty_pos,
+                np.concatenate(old) if old else np.empty(0, dtype=dtype),
+                np.concatenate(new) if new else np.empty(0, dtype=dtype)
+            ))
+        return UnitDiff(
+            np.concatenate(added) if added else empty_pos,
+            np.concatenate(removed) if removed else empty_pos,
+            *attributes,
+            changed_areas
+        )
+
+    # appends the differences between two versions of the same area to added, removed and changes (see diff_units)
+    # only the part of the area it owns is compared, like decode_area
+    def diff_areas(self, area_a: Area, area_b: Area, unit_base: List[int], added: List[np.ndarray],
+                   removed: List[np.ndarray],
+                   changes: Tuple[Tuple[List[np.ndarray], List[np.ndarray], List[np.ndarray]], ...]) -> None:
+        low, high = self.get_area_bounds(area_a, unit_base)
+        pruners: List[Pruner] = [get_box_pruner(low, high)]
+        base_pos: List[int] = self.get_area_base(area_a, unit_base)
+        if len(area_a.voxel_masks[0]) == 0 or len(area_b.voxel_masks[0]) == 0:
+            # one of the areas is empty so everything in the other one was added or removed
+            if len(area_a.voxel_masks[0]) != 0:
+                removed.append(decode_octree(area_a.voxel_masks, base_pos, pruners))
+            if len(area_b.voxel_masks[0]) != 0:
+                added.append(decode_octree(area_b.voxel_masks, base_pos, pruners))
+            return
+        positions: np.ndarray = np.array([base_pos], dtype=np.int32)
+        indices_a: np.ndarray = np.zeros(1, dtype=np.uint32)
+        indices_b: np.ndarray = np.zeros(1, dtype=np.uint32)
+        for level in range(8):
+            masks_a: np.ndarray = np.asarray(area_a.voxel_masks[level], dtype=np.uint32)[indices_a]
+            masks_b: np.ndarray = np.asarray(area_b.voxel_masks[level], dtype=np.uint32)[indices_b]
+            positions, present_a, present_b, indices_a, indices_b = expand_octree_pairs(masks_a, masks_b, positions, level)
+            keep: np.ndarray = pruners[0](level, positions, indices_a)
+            positions, present_a, present_b = positions[keep], present_a[keep], present_b[keep]
+            indices_a, indices_b = indices_a[keep], indices_b[keep]
+            # subtrees only present in one of the trees are decoded as a whole
+            for present, other, area, indices, out in ((present_a, present_b, area_a, indices_a, removed),
+                                                       (present_b, present_a, area_b, indices_b, added)):
+                only: np.ndarray = present & ~other
+                if not only.any():
+                    continue
+                if level == 7:
+                    out.append(positions[only])
+                else:
+                    out.append(decode_subtrees(area.voxel_masks, positions[only], indices[only], level + 1, pruners))
+            both: np.ndarray = present_a & present_b
+            positions, indices_a, indices_b = positions[both], indices_a[both], indices_b[both]
+            # drop the 32x32x32 nodes whose subtrees didn't change, this compares their data once instead of walking
+            # every unchanged subtree down to the voxels
+            if level == 2:
+                changed: np.ndarray = ~get_identical_subtrees(area_a, area_b, indices_a, indices_b, level + 1)
+                positions, indices_a, indices_b = positions[changed], indices_a[changed], indices_b[changed]
+            # compare the attributes stored at this level for nodes present in both trees
+            # single scene units have no surface_info2 or world_info, those are not compared if either side is missing them
+            if level == 5 and len(area_a.world_info) != 0 and len(area_b.world_info) != 0:
+                old: np.ndarray = np.asarray(area_a.world_info)[indices_a]
+                new: np.ndarray = np.asarray(area_b.world_info)[indices_b]
+                self.add_attribute_changes(changes[2], positions, old, new)
+            elif level == 6 and len(area_a.surface_info2) != 0 and len(area_b.surface_info2) != 0:
+                old: np.ndarray = read_bits_array(indices_a, area_a.surface_info2, 6)
+                new: np.ndarray = read_bits_array(indices_b, area_b.surface_info2, 6)
+                self.add_attribute_changes(changes[1], positions, old, new)
+            elif level == 7:
+                old: np.ndarray = read_bits_array(indices_a, area_a.surface_info, 10)
+                new: np.ndarray = read_bits_array(indices_b, area_b.surface_info, 10)
+                self.add_attribute_changes(changes[0], positions, old, new)
+
+    @staticmethod
+    def add_attribute_changes(change: Tuple[List[np.ndarray], List[np.ndarray], List[np.ndarray]],
+                              positions: np.ndarray, old: np.ndarray, new: np.ndarray) -> None:
+        differs: np.ndarray = old != new
+        if differs.any():
+            change[0].append(positions[differs])
+            change[1].append(old[differs])
+            change[2].append(new[differs])
+
+    def dump_unit_obj(self, unit: Union[str, Unit], unit_base: List[int], outfile: io.FileIO, max_level: int = 7) -> int:
+        if isinstance(unit, str):
+            unit = self.open_unit(unit)
+        positions: np.ndarray = self.decode_unit(unit, unit_base, max_level=max_level)
+
+        start: float = time.perf_counter() if self.instrumentation is not None else 0.0
+        size: int = 0
+        # format in chunks to avoid building one giant string for dense units
+        for i in range(0, len(positions), 0x10000):
+            chunk: np.ndarray = positions[i:i + 0x10000]
+            size += outfile.write(("v %d %d %d\n" * len(chunk)) % tuple(chunk.ravel().tolist()))
         
         outfile.write("\n")
 
+        if self.instrumentation is not None:
+            self.instrumentation.add(unit.path, "format", time.perf_counter() - start, voxels=len(positions), bytes_out=size)
         return len(positions)
     
     @staticmethod
@@ -206,27 +787,370 @@ class Context:
                     ]
                     self.iterate_octree(new_pos, positions, area, index, level + 1)
     
-    def dump_obj(self, outpath: str) -> None:
+    # returns the unit path and the gamedata flag it was selected for ("" for the base unit)
+    # note MainField has some units that are swapped out depending on GameData flags, the first flag in
+    # gamedata_flags with a variant of the unit wins
+    def resolve_unit(self, x: int, z: int) -> Tuple[str, str]:
+        return self.resolver.resolve(x, z, self.gamedata_flags)
+
+    def get_unit_path(self, x: int, z: int) -> str:
+        return self.resolve_unit(x, z)[0]
+
+    # units stay cached after the first query that touches them until evicted
+    def get_unit(self, x: int, z: int) -> Unit:
+        path, variant = self.resolve_unit(x, z)
+        return self.unit_cache.get_or_load((path, variant), lambda: self.open_unit(path))
+
+    def query(self, x: float, y: float, z: float) -> QueryResult:
+        # floor so fractional coordinates (e.g. actor positions) land in the voxel containing them, also for negative ones
+        local: List[int] = [
+            math.floor(x) - self.world_base[0], math.floor(y) - self.world_base[1], math.floor(z) - self.world_base[2]
+        ]
+        unit_pos: List[int] = [local[i] // self.unit_size[i] for i in range(3)]
+        if not all(0 <= unit_pos[i] < self.grid_dimensions[i] for i in range(3)):
+            return QueryResult(False, 0)
+        unit: Unit = self.get_unit(unit_pos[0], unit_pos[2])
+        local = [local[i] - unit_pos[i] * self.unit_size[i] for i in range(3)]
+        # each area owns a sidelength sized cube but its octree starts margin units before it
+        area_pos: List[int] = [min(local[i] // self.area_sidelength, unit.area_dims[i] - 1) for i in range(3)]
+        area: Area = unit[area_pos[0], area_pos[1], area_pos[2]]
+        return self.query_area(area, [local[i] - area_pos[i] * self.area_sidelength + self.area_margin[i] for i in range(3)])
+
+    # walks down the octree towards pos (relative to the area's octree origin) and stops at the first empty node
+    def query_area(self, area: Area, pos: List[int]) -> QueryResult:
+        result: QueryResult = QueryResult(False, 0)
+        if len(area.voxel_masks[0]) == 0 or not all(0 <= pos[i] < 0x100 for i in range(3)):
+            return result
+        index: int = 0
+        for level in range(8):
+            mask: int = int(area.voxel_masks[level][index])
+            shift: int = 7 - level
+            pos_flag: int = (pos[0] >> shift & 1) | (pos[1] >> shift & 1) << 1 | (pos[2] >> shift & 1) << 2
+            if mask >> pos_flag & 1 == 0:
+                result.level = level
+                return result
+            index = self.get_index(pos_flag, mask)
+            if level == 5 and len(area.world_info) > 0:
+                info = area.world_info[index]
+                result.world_info = info if isinstance(info, WorldInfo) else WorldInfo(*info.item())
+            elif level == 6 and len(area.surface_info2) > 0:
+                result.surface_info2 = read_bits(index, area.surface_info2, 6)
+        result.occupied = True
+        result.level = 8
+        result.surface_info = read_bits(index, area.surface_info, 10)
+        return result
+
+    # batched version of query, points is an (N, 3) array of world coordinates
+    # returns a dict of columns: occupied, level, surface_info, surface_info2 and every WorldInfo field
+    def query_many(self, points: np.ndarray) -> Dict[str, np.ndarray]:
+        if self.instrumentation is None:
+            return self.query_many_columns(points)
+        start: float = time.perf_counter()
+        columns: Dict[str, np.ndarray] = self.query_many_columns(points)
+        self.instrumentation.add("", "query", time.perf_counter() - start, points=len(columns["occupied"]))
+        return columns
+
+    def query_many_columns(self, points: np.ndarray) -> Dict[str, np.ndarray]:
+        points = np.asarray(points).reshape(-1, 3)
+        # floor fractional points (e.g. actor positions) like query, casting alone truncates negative ones toward zero
+        if not np.issubdtype(points.dtype, np.integer):
+            points = np.floor(points)
+        points = points.astype(np.int64)
+        columns: Dict[str, np.ndarray] = self.make_query_columns(len(points))
+        local: np.ndarray = points - np.array(self.world_base, dtype=np.int64)
+        unit_pos: np.ndarray = local // np.array(self.unit_size, dtype=np.int64)
+        valid: np.ndarray = np.all((unit_pos >= 0) & (unit_pos < np.array(self.grid_dimensions)), axis=1)
+        point_ids: np.ndarray = np.flatnonzero(valid)
+        if len(point_ids) == 0:
+            return columns
+        local = local[point_ids] - unit_pos[point_ids] * np.array(self.unit_size, dtype=np.int64)
+        unit_pos = unit_pos[point_ids]
+        # bucket by unit then area so each unit is loaded once and each area is descended in one go
+        area_pos: np.ndarray = local // self.area_sidelength
+        area_dims: np.ndarray = np.array([int(self.unit_size[i] / self.area_sidelength) for i in range(3)], dtype=np.int64)
+        area_pos = np.minimum(area_pos, area_dims - 1)
+        unit_key: np.ndarray = unit_pos[:, 0] * self.grid_dimensions[2] + unit_pos[:, 2]
+        area_key: np.ndarray = (area_pos[:, 1] * area_dims[2] + area_pos[:, 2]) * area_dims[0] + area_pos[:, 0]
+        key: np.ndarray = unit_key * int(np.prod(area_dims)) + area_key
+        order: np.ndarray = np.argsort(key, kind="stable")
+        starts: np.ndarray = np.flatnonzero(np.diff(key[order], prepend=-1))
+        ends: np.ndarray = np.append(starts[1:], len(order))
+        tree_pos: np.ndarray = local - area_pos * self.area_sidelength + np.array(self.area_margin, dtype=np.int64)
+        for start, end in zip(starts, ends):
+            group: np.ndarray = order[start:end]
+            first: int = group[0]
+            unit: Unit = self.get_unit(int(unit_pos[first, 0]), int(unit_pos[first, 2]))
+            area: Area = unit[int(area_pos[first, 0]), int(area_pos[first, 1]), int(area_pos[first, 2])]
+            self.query_area_many(area, tree_pos[group], point_ids[group], columns)
+        return columns
+
+    @staticmethod
+    def make_query_columns(count: int) -> Dict[str, np.ndarray]:
+        columns: Dict[str, np.ndarray] = {
+            "occupied": np.zeros(count, dtype=bool),
+            "level": np.zeros(count, dtype=np.uint8),
+            "surface_info": np.zeros(count, dtype=np.uint16),
+            "surface_info2": np.zeros(count, dtype=np.uint8),
+        }
+        for name in WORLD_INFO_DTYPE.names:
+            columns[name] = np.zeros(count, dtype=WORLD_INFO_DTYPE[name])
+        return columns
+
+    # descends all points of one (array-backed) area together, writing the results for point_ids into columns
+    def query_area_many(self, area: Area, pos: np.ndarray, point_ids: np.ndarray, columns: Dict[str, np.ndarray]) -> None:
+        if len(area.voxel_masks[0]) == 0:
+            return
+        inside: np.ndarray = np.all((pos >= 0) & (pos < 0x100), axis=1)
+        pos, point_ids = pos[inside], point_ids[inside]
+        world_info: np.ndarray = area.world_info
+        index: np.ndarray = np.zeros(len(pos), dtype=np.int64)
+        for level in range(8):
+            masks: np.ndarray = np.asarray(area.voxel_masks[level], dtype=np.uint32)[index]
+            shift: int = 7 - level
+            pos_flag: np.ndarray = ((pos[:, 0] >> shift & 1) | (pos[:, 1] >> shift & 1) << 1 | (pos[:, 2] >> shift & 1) << 2).astype(np.uint32)
+            present: np.ndarray = (masks >> pos_flag & 1).astype(bool)
+            # empty nodes stop early
+            columns["level"][point_ids[~present]] = level
+            pos, point_ids, masks, pos_flag = pos[present], point_ids[present], masks[present], pos_flag[present]
+            index = (POPCOUNT_LUT[masks & LOWER_BITS[pos_flag]] + (masks >> 8)).astype(np.int64)
+            if level == 5 and len(world_info) > 0:
+                info: np.ndarray = world_info[index]
+                for name in WORLD_INFO_DTYPE.names:
+                    columns[name][point_ids] = info[name]
+            elif level == 6 and len(area.surface_info2) > 0:
+                columns["surface_info2"][point_ids] = read_bits_array(index, area.surface_info2, 6)
+        columns["occupied"][point_ids] = True
+        columns["level"][point_ids] = 8
+        columns["surface_info"][point_ids] = read_bits_array(index, area.surface_info, 10)
+
+    # the empty cube a query stopped in (see QueryResult.level) as a world space box [low, high), clipped to the part
+    # of the area that owns the point since the octree's margins aren't authoritative for the neighboring areas
+    # points is an (N, 3) array of world coordinates inside the world
+    def get_empty_boxes(self, points: np.ndarray, levels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        world_base: np.ndarray = np.array(self.world_base, dtype=np.int64)
+        unit_size: np.ndarray = np.array(self.unit_size, dtype=np.int64)
+        local: np.ndarray = points - world_base
+        unit_pos: np.ndarray = local // unit_size
+        area_dims: np.ndarray = unit_size // self.area_sidelength
+        area_pos: np.ndarray = np.minimum((local - unit_pos * unit_size) // self.area_sidelength, area_dims - 1)
+        owned_low: np.ndarray = world_base + unit_pos * unit_size + area_pos * self.area_sidelength
+        tree_base: np.ndarray = owned_low - np.array(self.area_margin, dtype=np.int64)
+        size: np.ndarray = (1 << (7 - np.asarray(levels, dtype=np.int64)))[:, None]
+        low: np.ndarray = tree_base + (points - tree_base) // size * size
+        return np.maximum(low, owned_low), np.minimum(low + size, owned_low + self.area_sidelength)
+
+    # slab test against the world's bounds, returns the distances where each ray enters and leaves the world (enter >
+    # leave if it misses) and the axis it enters through
+    def clip_rays(self, origins: np.ndarray, directions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        low: np.ndarray = np.array(self.world_base, dtype=np.float64)
+        high: np.ndarray = low + np.array(self.unit_size, dtype=np.float64) * np.array(self.grid_dimensions)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t_low: np.ndarray = (low - origins) / directions
+            t_high: np.ndarray = (high - origins) / directions
+        # rays parallel to an axis either always or never overlap that slab
+        inside: np.ndarray = (origins >= low) & (origins < high)
+        parallel: np.ndarray = directions == 0
+        t_near: np.ndarray = np.where(parallel, np.where(inside, -np.inf, np.inf), np.minimum(t_low, t_high))
+        t_far: np.ndarray = np.where(parallel, np.where(inside, np.inf, -np.inf), np.maximum(t_low, t_high))
+        return np.maximum(t_near.max(axis=1), 0.0), t_far.min(axis=1), t_near.argmax(axis=1)
+
+    # finds the first occupied voxel along the ray within max_dist
+    # every empty octree node the ray passes through is skipped as a whole, so the number of steps depends on the
+    # number of empty nodes crossed rather than on the distance
+    def raycast(self, origin: Sequence[float], direction: Sequence[float], max_dist: float) -> RaycastResult:
+        length: float = math.sqrt(sum(float(c) ** 2 for c in direction))
+        assert length > 0, "Ray direction must not be zero"
+        o: List[float] = [float(c) for c in origin]
+        d: List[float] = [float(c) / length for c in direction]
+        t_enter, t_exit, axes = self.clip_rays(np.array([o]), np.array([d]))
+        t: float = float(t_enter[0])
+        t_limit: float = min(float(max_dist), float(t_exit[0]))
+        if t > t_limit:
+            return RaycastResult(False)
+        cell: List[int] = self.get_entry_cell(o, d, t)
+        normal: List[int] = [0, 0, 0]
+        if t > 0:
+            normal[int(axes[0])] = -1 if d[int(axes[0])] > 0 else 1
+        while True:
+            result: QueryResult = self.query(*cell)
+            if result.occupied:
+                return RaycastResult(True, t, tuple(cell), tuple(normal), result.surface_info, result.surface_info2,
+                                     result.world_info)
+            low, high = self.get_empty_boxes(np.array([cell], dtype=np.int64), np.array([result.level]))
+            # leave the empty box through the nearest face
+            t_next: float = math.inf
+            axis: int = 0
+            for i in range(3):
+                if d[i] != 0:
+                    t_face: float = (int(high[0, i] if d[i] > 0 else low[0, i]) - o[i]) / d[i]
+                    if t_face < t_next:
+                        t_next, axis = t_face, i
+            if t_next >= t_limit:
+                return RaycastResult(False)
+            t = t_next
+            cell = [math.floor(o[i] + t * d[i]) for i in range(3)]
+            # the crossed axis is set exactly so floating point error can't put the ray back into the same box
+            cell[axis] = int(high[0, axis]) if d[axis] > 0 else int(low[0, axis]) - 1
+            normal = [0, 0, 0]
+            normal[axis] = -1 if d[axis] > 0 else 1
+
+    # voxel containing origin + t * direction, clamped into the world for rays that start outside of it
+    def get_entry_cell(self, origin: List[float], direction: List[float], t: float) -> List[int]:
+        return [
+            min(max(math.floor(origin[i] + t * direction[i]), self.world_base[i]),
+                self.world_base[i] + self.unit_size[i] * self.grid_dimensions[i] - 1) for i in range(3)
+        ]
+
+    # batched version of raycast, origins and directions are (N, 3) arrays and max_dist is a scalar or (N,) array
+    # all rays still in flight are stepped together with one query_many per step
+    # returns a dict of columns: hit, distance, voxel, normal and the query_many attribute columns of the hit voxel
+    def raycast_many(self, origins: np.ndarray, directions: np.ndarray,
+                     max_dist: Union[float, np.ndarray]) -> Dict[str, np.ndarray]:
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        lengths: np.ndarray = np.linalg.norm(directions, axis=1)
+        assert np.all(lengths > 0), "Ray directions must not be zero"
+        directions = directions / lengths[:, None]
+        count: int = len(origins)
+        columns: Dict[str, np.ndarray] = self.make_query_columns(count)
+        del columns["occupied"], columns["level"]
+        columns["hit"] = np.zeros(count, dtype=bool)
+        columns["distance"] = np.zeros(count, dtype=np.float64)
+        columns["voxel"] = np.zeros((count, 3), dtype=np.int64)
+        columns["normal"] = np.zeros((count, 3), dtype=np.int8)
+        t, t_exit, axes = self.clip_rays(origins, directions)
+        t_limit: np.ndarray = np.minimum(np.broadcast_to(np.asarray(max_dist, dtype=np.float64), (count,)), t_exit)
+        ray_ids: np.ndarray = np.flatnonzero(t <= t_limit)
+        world_low: np.ndarray = np.array(self.world_base, dtype=np.int64)
+        world_high: np.ndarray = world_low + np.array(self.unit_size, dtype=np.int64) * np.array(self.grid_dimensions) - 1
+        cells: np.ndarray = np.floor(origins[ray_ids] + t[ray_ids, None] * directions[ray_ids]).astype(np.int64)
+        cells = np.clip(cells, world_low, world_high)
+        entered: np.ndarray = ray_ids[t[ray_ids] > 0]
+        columns["normal"][entered, axes[entered]] = -np.sign(directions[entered, axes[entered]]).astype(np.int8)
+        rows: np.ndarray = np.arange(count)
+        while len(ray_ids) > 0:
+            result: Dict[str, np.ndarray] = self.query_many(cells)
+            hit: np.ndarray = result["occupied"]
+            hit_ids: np.ndarray = ray_ids[hit]
+            columns["hit"][hit_ids] = True
+            columns["distance"][hit_ids] = t[hit_ids]
+            columns["voxel"][hit_ids] = cells[hit]
+            for name in result:
+                if name in columns:
+                    columns[name][hit_ids] = result[name][hit]
+            ray_ids, cells, levels = ray_ids[~hit], cells[~hit], result["level"][~hit]
+            low, high = self.get_empty_boxes(cells, levels)
+            o: np.ndarray = origins[ray_ids]
+            d: np.ndarray = directions[ray_ids]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t_face: np.ndarray = np.where(d > 0, (high - o) / d, np.where(d < 0, (low - o) / d, np.inf))
+            axis: np.ndarray = t_face.argmin(axis=1)
+            t_next: np.ndarray = t_face[rows[:len(ray_ids)], axis]
+            going: np.ndarray = t_next < t_limit[ray_ids]
+            ray_ids, o, d, low, high = ray_ids[going], o[going], d[going], low[going], high[going]
+            axis, t_next = axis[going], t_next[going]
+            t[ray_ids] = t_next
+            cells = np.floor(o + t_next[:, None] * d).astype(np.int64)
+            step_rows: np.ndarray = rows[:len(ray_ids)]
+            positive: np.ndarray = d[step_rows, axis] > 0
+            cells[step_rows, axis] = np.where(positive, high[step_rows, axis], low[step_rows, axis] - 1)
+            columns["normal"][ray_ids] = 0
+            columns["normal"][ray_ids, axis] = np.where(positive, -1, 1)
+        columns["normal"][~columns["hit"]] = 0
+        return columns
+
+    def get_unit_base(self, x: int, z: int) -> List[int]:
+        return [
+            self.world_base[0] + self.unit_size[0] * x,
+            self.world_base[1],
+            self.world_base[2] + self.unit_size[2] * z
+        ]
+
+    # returns the voxels in the world space box [min_xyz, max_xyz)
+    # only units and areas overlapping the box are loaded and each area only contributes the part it owns so voxels
+    # in the overlapping margins aren't duplicated
+    def extract_region(self, min_xyz: Sequence[int], max_xyz: Sequence[int],
+                       voxel_filter: Union[VoxelFilter, None] = None, max_level: int = 7) -> np.ndarray:
+        positions: List[np.ndarray] = []
+        for unit_pos, area_range in self.get_region_units(min_xyz, max_xyz):
+            unit: Unit = self.get_unit(unit_pos[0], unit_pos[2])
+            unit_base: List[int] = self.get_unit_base(unit_pos[0], unit_pos[2])
+            for y in range(area_range[0][1], area_range[1][1]):
+                for z in range(area_range[0][2], area_range[1][2]):
+                    for x in range(area_range[0][0], area_range[1][0]):
+                        area: Area = unit[x, y, z]
+                        positions.append(self.decode_area(area, unit_base, voxel_filter, (min_xyz, max_xyz), max_level))
+        if not positions:
+            return np.empty((0, 3), dtype=np.int32)
+        return np.concatenate(positions)
+
+    # yields the grid position of every unit overlapping the box [min_xyz, max_xyz) together with the
+    # [low, high) range of areas in that unit which overlap it
+    def get_region_units(self, min_xyz: Sequence[int],
+                         max_xyz: Sequence[int]) -> Iterator[Tuple[List[int], Tuple[List[int], List[int]]]]:
+        if any(min_xyz[i] >= max_xyz[i] for i in range(3)):
+            return
+        area_dims: List[int] = [int(self.unit_size[i] / self.area_sidelength) for i in range(3)]
+        first: List[int] = [max((min_xyz[i] - self.world_base[i]) // self.unit_size[i], 0) for i in range(3)]
+        last: List[int] = [min((max_xyz[i] - 1 - self.world_base[i]) // self.unit_size[i], self.grid_dimensions[i] - 1) for i in range(3)]
+        for x in range(first[0], last[0] + 1):
+            for z in range(first[2], last[2] + 1):
+                unit_pos: List[int] = [x, 0, z]
+                unit_low: List[int] = [self.world_base[i] + unit_pos[i] * self.unit_size[i] for i in range(3)]
+                low: List[int] = [max((min_xyz[i] - unit_low[i]) // self.area_sidelength, 0) for i in range(3)]
+                high: List[int] = [min((max_xyz[i] - 1 - unit_low[i]) // self.area_sidelength + 1, area_dims[i]) for i in range(3)]
+                if all(low[i] < high[i] for i in range(3)):
+                    yield unit_pos, (low, high)
+
+    # yields (x, z, unit path, unit base position) for every unit in the grid in X -> Z order
+    def iterate_units(self) -> Iterator[Tuple[int, int, str, List[int]]]:
+        for x in range(self.grid_dimensions[0]):
+            for z in range(self.grid_dimensions[2]):
+                yield x, z, self.get_unit_path(x, z), self.get_unit_base(x, z)
+
+    # same as iterate_units but also yields the opened unit
+    # with prefetch > 0, a pool of that many threads reads and decompresses up to prefetch units ahead (zstandard
+    # releases the GIL while decompressing) while the caller processes the current one
+    def iterate_loaded_units(self, prefetch: int = 0) -> Iterator[Tuple[int, int, str, List[int], Unit]]:
+        if prefetch <= 0:
+            for x, z, path, base_pos in self.iterate_units():
+                yield x, z, path, base_pos, self.open_unit(path)
+            return
+        units: Iterator[Tuple[int, int, str, List[int]]] = self.iterate_units()
+        pending: Deque[Tuple[int, int, str, List[int], Future]] = deque()
+        pool: ThreadPoolExecutor = ThreadPoolExecutor(prefetch)
+        try:
+            while True:
+                # the queue is bounded so at most prefetch decoded units are held at once
+                for x, z, path, base_pos in units:
+                    pending.append((x, z, path, base_pos, pool.submit(self.open_unit, path)))
+                    if len(pending) >= prefetch:
+                        break
+                if not pending:
+                    break
+                x, z, path, base_pos, future = pending.popleft()
+                if self.instrumentation is None:
+                    yield x, z, path, base_pos, future.result()
+                    continue
+                # time spent blocked on units that weren't ready yet
+                start: float = time.perf_counter()
+                unit: Unit = future.result()
+                self.instrumentation.add(path, "wait", time.perf_counter() - start)
+                yield x, z, path, base_pos, unit
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def get_worker_args(self) -> Tuple:
+        return (self.romfs_path, self.world_name, self.gamedata_flags, self.cache_dir)
+
+    def dump_obj(self, outpath: str, workers: int = 1, prefetch: int = 0, max_level: int = 7) -> None:
+        if workers > 1:
+            return self.dump_obj_parallel(outpath, workers, max_level)
         with open(outpath, "w", encoding="utf-8") as outfile:
             total: int = 0
-            for x in range(self.grid_dimensions[0]):
-                for z in range(self.grid_dimensions[2]):
-                    path: str = os.path.join(self.romfs_path, "VolumeStats", self.world_name, f"X{x}_Z{z}.vsts.zs")
-                    # note MainField has some units that are swapped out depending on GameData flags
-                    # the proper way to do this is to parse the vstats WorldParam file
-                    if self.gamedata_flags:
-                        for flag in self.gamedata_flags:
-                            gmd_path = os.path.exists(os.path.join(self.romfs_path, "VolumeStats", self.world_name, flag, f"X{x}_Z{z}.vsts.zs"))
-                            if os.path.exists(gmd_path):
-                                path = gmd_path
-                                break
-                    print(path)
-                    base_pos: List[int] = [
-                        self.world_base[0] + self.unit_size[0] * x,
-                        self.world_base[1],
-                        self.world_base[2] + self.unit_size[2] * z
-                    ]
-                    total += self.dump_unit_obj(path, base_pos, outfile)
+            for x, z, path, base_pos, unit in self.iterate_loaded_units(prefetch):
+                print(path)
+                total += self.dump_unit_obj(unit, base_pos, outfile, max_level)
             # with such a naive approach, writing the faces for the voxels takes forever so don't bother
             # for i in range(total):
             #     outfile.write(f"f {i * 8 + 1} {i * 8 + 2} {i * 8 + 4} {i * 8 + 3}\n")
@@ -236,39 +1160,286 @@ class Context:
             #     outfile.write(f"f {i * 8 + 3} {i * 8 + 4} {i * 8 + 8} {i * 8 + 7}\n")
             #     outfile.write(f"f {i * 8 + 5} {i * 8 + 6} {i * 8 + 8} {i * 8 + 7}\n")
 
-    def dump_individual_objs(self, outdir: str = "") -> None:
+    # each worker writes its units to separate part files which are then appended in unit order
+    # so the output is identical to the serial version
+    def dump_obj_parallel(self, outpath: str, workers: int, max_level: int = 7) -> None:
+        outdir: str = os.path.dirname(os.path.abspath(outpath))
+        with tempfile.TemporaryDirectory(dir=outdir) as tmpdir, \
+                ProcessPoolExecutor(workers, initializer=init_worker, initargs=self.get_worker_args()) as pool, \
+                open(outpath, "wb") as outfile:
+            jobs: List[Tuple[str, Future]] = []
+            for x, z, path, base_pos in self.iterate_units():
+                part_path: str = os.path.join(tmpdir, f"X{x}_Z{z}.obj")
+                jobs.append((path, pool.submit(dump_unit_obj_worker, path, base_pos, part_path, max_level)))
+            for path, future in jobs:
+                part_path: str = future.result()[0]
+                print(path)
+                with open(part_path, "rb") as part:
+                    shutil.copyfileobj(part, outfile)
+                os.remove(part_path)
+
+    def dump_individual_objs(self, outdir: str = "", workers: int = 1, prefetch: int = 0, max_level: int = 7) -> None:
         if outdir:
             os.makedirs(outdir, exist_ok=True)
-        for x in range(self.grid_dimensions[0]):
-            for z in range(self.grid_dimensions[2]):
-                path: str = os.path.join(self.romfs_path, "VolumeStats", self.world_name, f"X{x}_Z{z}.vsts.zs")
-                # note MainField has some units that are swapped out depending on GameData flags
-                # the proper way to do this is to parse the vstats WorldParam file
-                if self.gamedata_flags:
-                    for flag in self.gamedata_flags:
-                        gmd_path = os.path.join(self.romfs_path, "VolumeStats", self.world_name, flag, f"X{x}_Z{z}.vsts.zs")
-                        if os.path.exists(gmd_path):
-                            path = gmd_path
-                            break
-                with open(os.path.join(outdir, f"{self.world_name}_X{x}_Z{z}.obj"), "w", encoding="utf-8") as outfile:
+        if workers > 1:
+            with ProcessPoolExecutor(workers, initializer=init_worker, initargs=self.get_worker_args()) as pool:
+                jobs: List[Tuple[str, Future]] = [
+                    (path, pool.submit(dump_unit_obj_worker, path, base_pos, os.path.join(outdir, f"{self.world_name}_X{x}_Z{z}.obj"), max_level))
+                        for x, z, path, base_pos in self.iterate_units()
+                ]
+                for path, future in jobs:
+                    future.result()
                     print(path)
-                    base_pos: List[int] = [
-                        self.world_base[0] + self.unit_size[0] * x,
-                        self.world_base[1],
-                        self.world_base[2] + self.unit_size[2] * z
-                    ]
-                    self.dump_unit_obj(path, base_pos, outfile)
+            return
+        for x, z, path, base_pos, unit in self.iterate_loaded_units(prefetch):
+            with open(os.path.join(outdir, f"{self.world_name}_X{x}_Z{z}.obj"), "w", encoding="utf-8") as outfile:
+                print(path)
+                self.dump_unit_obj(unit, base_pos, outfile, max_level)
     
+    # streams every area's voxels to the exporter without building a per-unit position list
+    def export_unit(self, unit: Union[str, Unit], unit_base: List[int], exporter: Exporter,
+                    voxel_filter: Union[VoxelFilter, None] = None, max_level: int = 7) -> int:
+        if isinstance(unit, str):
+            unit = self.open_unit(unit)
+        if self.instrumentation is not None:
+            return self.export_unit_instrumented(unit, unit_base, exporter, voxel_filter, max_level)
+        count: int = 0
+        for area in unit:
+            positions: np.ndarray = self.decode_area(area, unit_base, voxel_filter, max_level=max_level)
+            exporter.write(positions)
+            count += len(positions)
+        return count
+
+    # same as export_unit but times the decoding and the writing separately
+    def export_unit_instrumented(self, unit: Unit, unit_base: List[int], exporter: Exporter,
+                                 voxel_filter: Union[VoxelFilter, None] = None, max_level: int = 7) -> int:
+        traverse_seconds: float = 0.0
+        write_seconds: float = 0.0
+        count: int = 0
+        for area in unit:
+            start: float = time.perf_counter()
+            positions: np.ndarray = self.decode_area(area, unit_base, voxel_filter, max_level=max_level)
+            decoded: float = time.perf_counter()
+            exporter.write(positions)
+            write_seconds += time.perf_counter() - decoded
+            traverse_seconds += decoded - start
+            count += len(positions)
+        self.instrumentation.add(unit.path, "traverse", traverse_seconds, areas=len(unit), nodes=unit.get_node_count(),
+                                 voxels=count)
+        self.instrumentation.add(unit.path, "write", write_seconds, voxels=count)
+        return count
+
+    # smallest integer type that can hold every voxel position in the world (including the area margins)
+    def get_coordinate_dtype(self) -> np.dtype:
+        low: int = min(self.world_base[i] - self.area_margin[i] for i in range(3))
+        high: int = max(self.world_base[i] + self.unit_size[i] * self.grid_dimensions[i] + self.area_margin[i] for i in range(3))
+        info: np.iinfo = np.iinfo(np.int16)
+        return np.dtype(np.int16) if info.min <= low and high <= info.max else np.dtype(np.int32)
+
+    # exports the whole world in one of the compact formats in exporters.py (ply, npy or runs)
+    def export(self, outpath: str, format: str = "ply", dtype: Union[np.dtype, None] = None, prefetch: int = 0,
+               voxel_filter: Union[VoxelFilter, None] = None, max_level: int = 7) -> int:
+        if dtype is None:
+            dtype = self.get_coordinate_dtype()
+        with get_exporter(outpath, format, dtype, get_voxel_size(max_level)) as exporter:
+            for x, z, path, base_pos, unit in self.iterate_loaded_units(prefetch):
+                print(path)
+                self.export_unit(unit, base_pos, exporter, voxel_filter, max_level)
+        return exporter.count
+
+    # meshes all voxels of a unit at once, returns (vertices, quads)
+    def mesh_unit(self, unit: Union[str, Unit], unit_base: List[int], greedy: bool = True,
+                  voxel_filter: Union[VoxelFilter, None] = None, max_level: int = 7) -> Tuple[np.ndarray, np.ndarray]:
+        if isinstance(unit, str):
+            unit = self.open_unit(unit)
+        if max_level == 7:
+            positions: np.ndarray = self.decode_unit(unit, unit_base, voxel_filter)
+            start: float = time.perf_counter() if self.instrumentation is not None else 0.0
+            mesh: Tuple[np.ndarray, np.ndarray] = mesh_voxels(positions, greedy)
+        else:
+            # coarser cubes are only aligned within an area (areas are sidelength apart) so mesh them one by one
+            start: float = time.perf_counter() if self.instrumentation is not None else 0.0
+            mesh: Tuple[np.ndarray, np.ndarray] = merge_meshes([
+                mesh_voxels(self.decode_area(area, unit_base, voxel_filter, max_level=max_level), greedy, get_voxel_size(max_level))
+                    for area in unit
+            ])
+        # coarser levels decode while meshing so their traversal is included here
+        if self.instrumentation is not None:
+            self.instrumentation.add(unit.path, "mesh", time.perf_counter() - start, vertices=len(mesh[0]), faces=len(mesh[1]))
+        return mesh
+
+    # exports the world as a mesh with hidden faces removed, each unit is meshed separately
+    def export_mesh(self, outpath: str, format: str = "ply", greedy: bool = True, prefetch: int = 0,
+                    voxel_filter: Union[VoxelFilter, None] = None, max_level: int = 7) -> Tuple[int, int]:
+        with get_mesh_exporter(outpath, format, self.get_coordinate_dtype()) as exporter:
+            for x, z, path, base_pos, unit in self.iterate_loaded_units(prefetch):
+                print(path)
+                exporter.write_mesh(*self.mesh_unit(unit, base_pos, greedy, voxel_filter, max_level))
+        return exporter.vertex_count, exporter.face_count
+
+    # fills the per-column rasters (see raster.py) from the floor voxels an area owns inside the unit's columns
+    # the decode carries the index of each node's 4x4x4 ancestor along so no position lists beyond the area's floor
+    # voxels are built
+    def rasterize_area(self, area: Area, unit_base: List[int], rasters: Dict[str, np.ndarray]) -> None:
+        if len(area.voxel_masks[0]) == 0:
+            return
+        low, high = self.get_area_bounds(area, unit_base)
+        pruners: List[Pruner] = [get_box_pruner(low, high), VoxelFilter.floor().get_pruner(area)]
+        positions: np.ndarray = np.array([self.get_area_base(area, unit_base)], dtype=np.int32)
+        indices: np.ndarray = np.zeros(1, dtype=np.uint32)
+        positions, indices, _ = expand_octree(area.voxel_masks, positions, indices, range(6), pruners)
+        # index into world_info of every voxel's 4x4x4 ancestor
+        positions, indices, (info_indices,) = expand_octree(area.voxel_masks, positions, indices, range(6, 8), pruners,
+                                                            [indices])
+        columns: np.ndarray = (positions[:, 2] - unit_base[2]) * self.unit_size[0] + positions[:, 0] - unit_base[0]
+        world_info: Union[np.ndarray, None] = None
+        if len(area.world_info) != 0:
+            world_info = np.asarray(area.world_info)[info_indices]
+        update_rasters(rasters, columns, positions[:, 1], world_info)
+
+    def rasterize_unit(self, unit: Union[str, Unit], unit_base: List[int]) -> Dict[str, np.ndarray]:
+        if isinstance(unit, str):
+            unit = self.open_unit(unit)
+        start: float = time.perf_counter() if self.instrumentation is not None else 0.0
+        rasters: Dict[str, np.ndarray] = make_rasters(self.unit_size[0], self.unit_size[2])
+        for area in unit:
+            self.rasterize_area(area, unit_base, rasters)
+        if self.instrumentation is not None:
+            self.instrumentation.add(unit.path, "rasterize", time.perf_counter() - start, areas=len(unit),
+                                     nodes=unit.get_node_count())
+        return rasters
+
+    def export_unit_rasters(self, unit: Union[str, Unit], unit_base: List[int], outdir: str, name: str,
+                            levels: int = 1) -> List[str]:
+        return save_raster_pyramid(self.rasterize_unit(unit, unit_base), outdir, name, levels)
+
+    # writes one <outdir>/<product>/<level>/X{x}_Z{z}.npy tile per unit and product, levels > 1 adds downsampled
+    # levels of detail
+    def export_rasters(self, outdir: str, workers: int = 1, prefetch: int = 0, levels: int = 1) -> None:
+        if workers > 1:
+            with ProcessPoolExecutor(workers, initializer=init_worker, initargs=self.get_worker_args()) as pool:
+                jobs: List[Tuple[str, Future]] = [
+                    (path, pool.submit(export_unit_rasters_worker, path, base_pos, outdir, f"X{x}_Z{z}", levels))
+                        for x, z, path, base_pos in self.iterate_units()
+                ]
+                for path, future in jobs:
+                    future.result()
+                    print(path)
+            return
+        for x, z, path, base_pos, unit in self.iterate_loaded_units(prefetch):
+            print(path)
+            self.export_unit_rasters(unit, base_pos, outdir, f"X{x}_Z{z}", levels)
+
+    # adds the voxels an area owns to stats (see stats.py)
+    # the octree is expanded with positions down to the 4x4x4 nodes (indices into world_info), only nodes crossing
+    # the owned box or in a cave (for the cave bounds) keep their positions below that, the voxels of every other
+    # node are expanded by index alone
+    def add_area_stats(self, area: Area, unit_base: List[int], stats: VoxelStats) -> None:
+        if len(area.voxel_masks[0]) == 0:
+            return
+        low, high = self.get_area_bounds(area, unit_base)
+        prune: Pruner = get_box_pruner(low, high)
+        positions: np.ndarray = np.array([self.get_area_base(area, unit_base)], dtype=np.int32)
+        indices: np.ndarray = np.zeros(1, dtype=np.uint32)
+        positions, indices, _ = expand_octree(area.voxel_masks, positions, indices, range(6), [prune])
+        world_info: Union[np.ndarray, None] = np.asarray(area.world_info) if len(area.world_info) != 0 else None
+        needs_positions: np.ndarray = ~np.all((positions >= low) & (positions + 4 <= high), axis=1)
+        if world_info is not None:
+            needs_positions |= world_info["cave_id"][indices] != 0
+
+        # 4x4x4 nodes entirely inside the owned box, expanded to the 2x2x2 nodes (indices into surface_info2) and
+        # then the voxels while carrying the index into world_info along
+        info_index: np.ndarray = indices[~needs_positions]
+        _, node2_index, (info_index,) = expand_octree(area.voxel_masks, None, info_index, (6,), carry=[info_index])
+        _, voxel_index, (info_index, node2_index) = expand_octree(area.voxel_masks, None, node2_index, (7,),
+                                                                  carry=[info_index, node2_index])
+        self.add_voxel_stats(area, stats, voxel_index, node2_index, info_index)
+
+        # 4x4x4 nodes on the edge of the owned box or in a cave
+        positions, info_index = positions[needs_positions], indices[needs_positions]
+        positions, node2_index, (info_index,) = expand_octree(area.voxel_masks, positions, info_index, (6,), [prune],
+                                                              [info_index])
+        positions, voxel_index, (info_index, node2_index) = expand_octree(area.voxel_masks, positions, node2_index,
+                                                                          (7,), [prune], [info_index, node2_index])
+        self.add_voxel_stats(area, stats, voxel_index, node2_index, info_index)
+        if world_info is not None:
+            cave_id: np.ndarray = world_info["cave_id"][info_index]
+            in_cave: np.ndarray = cave_id != 0
+            stats.add_caves(cave_id[in_cave], positions[in_cave])
+
+    # voxel_index, node2_index and info_index are each voxel's index into surface_info, surface_info2 and world_info
+    @staticmethod
+    def add_voxel_stats(area: Area, stats: VoxelStats, voxel_index: np.ndarray, node2_index: np.ndarray,
+                        info_index: np.ndarray) -> None:
+        if len(voxel_index) == 0:
+            return
+        surface_info2: Union[np.ndarray, None] = None
+        if len(area.surface_info2) != 0:
+            surface_info2 = read_bits_array(node2_index, area.surface_info2, 6)
+        world_info: Union[np.ndarray, None] = np.asarray(area.world_info) if len(area.world_info) != 0 else None
+        stats.add_voxels(read_bits_array(voxel_index, area.surface_info, 10), surface_info2, world_info, info_index)
+
+    def compute_unit_stats(self, unit: Union[str, Unit], unit_base: List[int]) -> VoxelStats:
+        if isinstance(unit, str):
+            unit = self.open_unit(unit)
+        start: float = time.perf_counter() if self.instrumentation is not None else 0.0
+        stats: VoxelStats = VoxelStats()
+        for area in unit:
+            self.add_area_stats(area, unit_base, stats)
+        if self.instrumentation is not None:
+            self.instrumentation.add(unit.path, "stats", time.perf_counter() - start, areas=len(unit),
+                                     voxels=stats.voxels)
+        return stats
+
+    # voxel counts by surface_info, surface_info2 and WorldInfo values plus cave volumes and bounds for every unit
+    # (keyed by X{x}_Z{z}) and the whole world, positions are only decoded where they're needed
+    # with workers > 1, units are reduced in worker processes and merged here in unit order
+    def compute_stats(self, workers: int = 1, prefetch: int = 0) -> WorldStats:
+        units: Dict[str, VoxelStats] = {}
+        if workers > 1:
+            with ProcessPoolExecutor(workers, initializer=init_worker, initargs=self.get_worker_args()) as pool:
+                jobs: List[Tuple[str, Future]] = [
+                    (f"X{x}_Z{z}", pool.submit(compute_unit_stats_worker, path, base_pos))
+                        for x, z, path, base_pos in self.iterate_units()
+                ]
+                for name, future in jobs:
+                    units[name] = future.result()
+        else:
+            for x, z, path, base_pos, unit in self.iterate_loaded_units(prefetch):
+                units[f"X{x}_Z{z}"] = self.compute_unit_stats(unit, base_pos)
+        total: VoxelStats = VoxelStats()
+        for stats in units.values():
+            total.merge(stats)
+        return WorldStats(units, total)
+
     def dump_unit_obj_individual(self, x: int, z: int, outdir: str = "", gamedata: str = "") -> None:
+        path, flag = self.resolver.resolve(x, z, [gamedata] if gamedata else [])
+        # resolve falls back to the base unit, which would be written under the same name as the variant
+        if flag != gamedata:
+            raise FileNotFoundError(f"Unit X{x}_Z{z} has no {gamedata} variant")
         if outdir:
             os.makedirs(outdir, exist_ok=True)
-        if gamedata == "":
-            path: str = os.path.join(self.romfs_path, "VolumeStats", self.world_name, f"X{x}_Z{z}.vsts.zs")
-        else:
-            path: str = os.path.join(self.romfs_path, "VolumeStats", self.world_name, gamedata, f"X{x}_Z{z}.vsts.zs")
         with open(os.path.join(outdir, f"{self.world_name}_X{x}_Z{z}.obj"), "w", encoding="utf-8") as outfile:
             self.dump_unit_obj(path, [0, self.world_base[1], 0], outfile)
 
+# process pool workers each hold their own context (and with it their own ZstdDecompContext)
+worker_ctx: Union[Context, None] = None
+
+def init_worker(romfs_path: str, world_name: str, gamedata_flags: List[str], cache_dir: str) -> None:
+    global worker_ctx
+    worker_ctx = Context(romfs_path, world_name, gamedata_flags, cache_dir=cache_dir)
+
+def dump_unit_obj_worker(unit_path: str, unit_base: List[int], outpath: str, max_level: int = 7) -> Tuple[str, int]:
+    with open(outpath, "w", encoding="utf-8") as outfile:
+        return outpath, worker_ctx.dump_unit_obj(unit_path, unit_base, outfile, max_level)
+
+def export_unit_rasters_worker(unit_path: str, unit_base: List[int], outdir: str, name: str,
+                               levels: int = 1) -> List[str]:
+    return worker_ctx.export_unit_rasters(unit_path, unit_base, outdir, name, levels)
+
+def compute_unit_stats_worker(unit_path: str, unit_base: List[int]) -> VoxelStats:
+    return worker_ctx.compute_unit_stats(unit_path, unit_base)
+
 if __name__ == "__main__":
     import sys
 
@@ -286,9 +1457,26 @@ if __name__ == "__main__":
         flags: List[str] = ["SageOfGerudo_IsAfter_DungeonBossDead_Exp", "SageOfGerudo_IsAfter_DungeonFind_Exp", "SageOfSoul_HiddenStairsAppear"]
     else:
         flags: List[str] = []
-    ctx: Context = Context(romfs_path, world_name, flags)
+    # obj (default), ply, npy, runs, rasters (per unit .npy map tiles) or stats (attribute statistics as json)
+    format: str = sys.argv[3] if len(sys.argv) > 3 else "obj"
+    # octree level to stop at, 7 is full resolution and each level above halves it
+    max_level: int = int(sys.argv[4]) if len(sys.argv) > 4 else 7
+
+    # set VSTATS_REPORT to a path to write per-unit and per-stage timings there, worker processes aren't instrumented
+    # so everything runs in this process
+    report_path: str = os.environ.get("VSTATS_REPORT", "")
+    ctx: Context = Context(romfs_path, world_name, flags, instrumentation=Instrumentation() if report_path else None)
+    workers: int = 1 if report_path else os.cpu_count() or 1
+    if format == "rasters":
+        ctx.export_rasters(f"{world_name}Rasters", workers, levels=4)
+    elif format == "stats":
+        ctx.compute_stats(workers).write_json(f"{world_name}Stats.json")
+    elif format != "obj":
+        ctx.export(f"{world_name}.{EXPORTERS[format].extension}", format, prefetch=workers, max_level=max_level)
     # MainField takes around 10 min and produces a 9 gb obj file so...
-    if world_name == "MainField":
-        ctx.dump_individual_objs("MainFieldOut")
+    elif world_name == "MainField":
+        ctx.dump_individual_objs("MainFieldOut", workers, max_level=max_level)
     else:
-        ctx.dump_obj(f"{world_name}.obj")
\ No newline at end of file
+        ctx.dump_obj(f"{world_name}.obj", workers, max_level=max_level)
+    if report_path:
+        ctx.write_instrumentation_report(report_path)
@@ -11,65 +11,190 @@ except ImportError:
         import sarc
     except ImportError:
         raise ImportError("sarc.py not found")
-from functools import lru_cache
+from instrument import Instrumentation
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Union
 import enum
+import os
 import sys
+import threading
+import time
 
 class DictType(enum.Enum):
     ZSDIC = 1
     BCETT = 2
     PACK  = 3
 
-class ZstdDecompressor(zstd.ZstdDecompressor):
+# these wrap zstandard's (de)compressors instead of subclassing them, freeing an instance of a python subclass of them
+# corrupts the heap (zstandard's types aren't gc aware but subclasses are) and the per-thread instances below are freed
+# whenever a thread or context goes away, everything else is forwarded to the wrapped object
+class ZstdDecompressor:
+    __slots__ = ["dctx"]
+
     def __init__(self, dictionary: zstd.ZstdCompressionDict=None, format: int=zstd.FORMAT_ZSTD1) -> None:
-        super().__init__(dict_data=dictionary, format=format)
+        self.dctx: zstd.ZstdDecompressor = zstd.ZstdDecompressor(dict_data=dictionary, format=format)
+
+    def __getattr__(self, name: str):
+        return getattr(self.dctx, name)
 
     def _decompress(self, data: bytes) -> bytes:
-        return self.decompress(data)
+        return self.dctx.decompress(data)
     
-class ZstdCompressor(zstd.ZstdCompressor):
+class ZstdCompressor:
+    __slots__ = ["cctx"]
+
     def __init__(self, dictionary: zstd.ZstdCompressionDict=None) -> None:
-        super().__init__(dict_data=dictionary)
+        self.cctx: zstd.ZstdCompressor = zstd.ZstdCompressor(dict_data=dictionary)
+
+    def __getattr__(self, name: str):
+        return getattr(self.cctx, name)
     
     def _compress(self, data: bytes) -> bytes:
-        return self.compress(data)
+        return self.cctx.compress(data)
+
+# dictionaries by absolute pack path, shared by every ZstdDecompContext in the process so the pack is only read once
+# zstandard digests a dictionary the first time it's used and keeps the result on the dictionary object, so sharing
+# them also shares that work between the per-thread decompressors
+dictionary_registry: Dict[str, Dict[str, zstd.ZstdCompressionDict]] = {}
+registry_lock: threading.Lock = threading.Lock()
+
+def reset_registry_lock() -> None:
+    # another thread may have held the lock when the process forked, the child would never see it released
+    global registry_lock
+    registry_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_registry_lock)
+
+def load_dictionaries(zsdic_pack_path: str) -> Dict[str, zstd.ZstdCompressionDict]:
+    vanilla_decompressor: zstd.ZstdDecompressor = zstd.ZstdDecompressor()
+    if "oead" in sys.modules:
+        archive: oead.Sarc = oead.Sarc(vanilla_decompressor.decompress(Path(zsdic_pack_path).read_bytes()))
+        return {f.name: zstd.ZstdCompressionDict(f.data) for f in archive.get_files()}
+    archive: sarc.SarcReader = sarc.SarcReader(vanilla_decompressor.decompress(Path(zsdic_pack_path).read_bytes()))
+    return {name : zstd.ZstdCompressionDict(bytes(data)) for name, data in archive.IterFiles()}
+
+def get_dictionaries(zsdic_pack_path: str) -> Dict[str, zstd.ZstdCompressionDict]:
+    key: str = os.path.abspath(zsdic_pack_path)
+    with registry_lock:
+        if key not in dictionary_registry:
+            dictionary_registry[key] = load_dictionaries(zsdic_pack_path)
+        return dictionary_registry[key]
 
 class ZstdDecompContext:
-    @lru_cache
     def __init__(self, zsdic_pack_path: str="") -> None:
-        vanilla_decompressor: zstd.ZstdDecompressor = zstd.ZstdDecompressor()
-        if "oead" in sys.modules:
-            archive: oead.Sarc = oead.Sarc(vanilla_decompressor.decompress(Path(zsdic_pack_path).read_bytes()))
-            dictionaries: Dict[str, zstd.ZstdCompressionDict] = {f.name: zstd.ZstdCompressionDict(f.data) for f in archive.get_files()}
+        self.dictionaries: Dict[str, zstd.ZstdCompressionDict] = get_dictionaries(zsdic_pack_path)
+        # zstandard (de)compressor objects aren't safe to use from multiple threads at once so each thread lazily
+        # creates its own from the shared dictionaries (a forked child keeps the forking thread's)
+        self.local: threading.local = threading.local()
+        # records read and decompress timings when set (see instrument.py)
+        self.instrumentation: Union[Instrumentation, None] = None
+
+    # returns the decompressors for the calling thread
+    def get_decompressors(self) -> threading.local:
+        local: threading.local = self.local
+        if not hasattr(local, "zs"):
+            local.pack = ZstdDecompressor(self.dictionaries["pack.zsdic"])
+            local.bcett = ZstdDecompressor(self.dictionaries["bcett.byml.zsdic"])
+            local.zs = ZstdDecompressor(self.dictionaries["zs.zsdic"])
+            local.mc = ZstdDecompressor(format=zstd.FORMAT_ZSTD1_MAGICLESS)
+        return local
+
+    def get_compressors(self) -> threading.local:
+        local: threading.local = self.local
+        if not hasattr(local, "zs_compress"):
+            local.pack_compress = ZstdCompressor(self.dictionaries["pack.zsdic"])
+            local.bcett_compress = ZstdCompressor(self.dictionaries["bcett.byml.zsdic"])
+            local.zs_compress = ZstdCompressor(self.dictionaries["zs.zsdic"])
+        return local
+
+    # the calling thread's (de)compressors under their old attribute names
+    @property
+    def pack(self) -> ZstdDecompressor:
+        return self.get_decompressors().pack
+
+    @property
+    def bcett(self) -> ZstdDecompressor:
+        return self.get_decompressors().bcett
+
+    @property
+    def zs(self) -> ZstdDecompressor:
+        return self.get_decompressors().zs
+
+    @property
+    def mc(self) -> ZstdDecompressor:
+        return self.get_decompressors().mc
+
+    @property
+    def pack_compress(self) -> ZstdCompressor:
+        return self.get_compressors().pack_compress
+
+    @property
+    def bcett_compress(self) -> ZstdCompressor:
+        return self.get_compressors().bcett_compress
+
+    @property
+    def zs_compress(self) -> ZstdCompressor:
+        return self.get_compressors().zs_compress
+
+    # picks the decompressor for a zstd frame from the dictionary id in its header
+    def get_decompressor(self, data: Union[bytes, memoryview]) -> ZstdDecompressor:
+        dctx = self.get_decompressors()
+        id: int = zstd.get_frame_parameters(data).dict_id
+        if id == 1:
+            return dctx.zs
+        elif id == 2:
+            return dctx.bcett
+        elif id == 3:
+            return dctx.pack
         else:
-            archive: sarc.Sarc = sarc.Sarc(vanilla_decompressor.decompress(Path(zsdic_pack_path).read_bytes()))
-            dictionaries: Dict[str, zstd.ZstdCompressionDict] = {i["Name"] : zstd.ZstdCompressionDict(i["Data"]) for i in archive.files}
-        self.pack: ZstdDecompressor = ZstdDecompressor(dictionaries["pack.zsdic"])
-        self.bcett: ZstdDecompressor = ZstdDecompressor(dictionaries["bcett.byml.zsdic"])
-        self.zs: ZstdDecompressor = ZstdDecompressor(dictionaries["zs.zsdic"])
-        self.mc: ZstdDecompressor = ZstdDecompressor(format=zstd.FORMAT_ZSTD1_MAGICLESS)
-        self.pack_compress: ZstdCompressor = ZstdCompressor(dictionaries["pack.zsdic"])
-        self.bcett_compress: ZstdCompressor = ZstdCompressor(dictionaries["bcett.byml.zsdic"])
-        self.zs_compress: ZstdCompressor = ZstdCompressor(dictionaries["zs.zsdic"])
-    
+            return dctx.zs
+
     def decompress(self, filepath: str) -> bytes:
+        if self.instrumentation is not None:
+            return self.decompress_instrumented(filepath)
         if not(filepath.endswith(".zs") or filepath.endswith(".zstd") or filepath.endswith(".mc")):
             return Path(filepath).read_bytes()
         elif filepath.endswith(".mc"):
             return self.mc._decompress(Path(filepath).read_bytes()[0xc:])
+        return self.decompress_bytes(Path(filepath).read_bytes())
+
+    # same as decompress but records the file read and the decompression separately
+    def decompress_instrumented(self, filepath: str) -> bytes:
+        start: float = time.perf_counter()
         data: bytes = Path(filepath).read_bytes()
-        id: int = zstd.get_frame_parameters(data).dict_id
-        if id == 1:
-            return self.zs._decompress(data)
-        elif id == 2:
-            return self.bcett._decompress(data)
-        elif id == 3:
-            return self.pack._decompress(data)
+        read_end: float = time.perf_counter()
+        self.instrumentation.add(filepath, "read", read_end - start, bytes_in=len(data))
+        if filepath.endswith(".mc"):
+            result: bytes = self.mc._decompress(data[0xc:])
+        elif filepath.endswith(".zs") or filepath.endswith(".zstd"):
+            result: bytes = self.decompress_bytes(data)
         else:
-            return self.zs._decompress(data)
-    
+            return data
+        self.instrumentation.add(filepath, "decompress", time.perf_counter() - read_end, bytes_in=len(data),
+                                 bytes_out=len(result))
+        return result
+
+    # data can be bytes or any other buffer (e.g. an mmap of the file), output_size is only needed if the frame
+    # doesn't store its decompressed size
+    def decompress_bytes(self, data: Union[bytes, memoryview], output_size: int = 0) -> bytes:
+        return self.get_decompressor(data).decompress(data, max_output_size=output_size)
+
+    # decompresses straight into out (any writable buffer such as a bytearray or a writable mmap), which must be at
+    # least as large as the decompressed data, returns the number of bytes written
+    def decompress_into(self, data: Union[bytes, memoryview], out: Union[bytearray, memoryview]) -> int:
+        view: memoryview = memoryview(out).cast("B")
+        size: int = 0
+        # stream_reader reads file-like objects such as an mmap through their file position and closes them, read
+        # from a view of the buffer instead so data is left as it was
+        with memoryview(data) as source, self.get_decompressor(data).stream_reader(source, closefd=False) as reader:
+            while size < len(view):
+                count: int = reader.readinto(view[size:])
+                if count == 0:
+                    break
+                size += count
+        return size
+
     def compress(self, filepath: str, dict: DictType = DictType.ZSDIC) -> bytes:
         if dict == DictType.PACK:
             return self.pack_compress._compress(Path(filepath).read_bytes())